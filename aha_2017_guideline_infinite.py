@@ -4,9 +4,9 @@
 
 # Loading modules
 import numpy as np
-from post_treatment_risk import new_risk
-from sbp_reductions_drugtype import sbp_reductions_generic
-from dbp_reductions_drugtype import dbp_reductions_generic
+from post_treatment_risk import new_risk, post_treatment_risk
+from sbp_reductions_drugtype import sbp_reductions_generic, sbp_reductions_generic_table, take_reductions
+from dbp_reductions_drugtype import dbp_reductions_generic, dbp_reductions_generic_table
 
 # Function to obtain policy according to the AHA's guideline (Infinite Horizon Version)
 def aha_guideline_infinite(pretrtrisk, pretrtsbp, pretrtdbp, targetrisk, targetsbp, targetdbp, sbpmin, dbpmin,
@@ -109,3 +109,72 @@ def aha_guideline_infinite(pretrtrisk, pretrtsbp, pretrtdbp, targetrisk, targets
             policy[h] = past_trt # keep current treatment
     
     return policy
+
+# Function to obtain policies according to the AHA's guideline for a batch of patients (Infinite Horizon Version)
+def aha_guideline_batch(pretrtrisk, pretrtsbp, pretrtdbp, targetrisk, targetsbp, targetdbp, sbpmin, dbpmin,
+                        riskslope, numtrt, healthy):
+    """
+    Same titration rules as aha_guideline_infinite, applied to every patient and health state at once
+
+    Post-treatment SBP and DBP of 0 to numtrt medications are computed once per patient and state, and the
+    12 monthly evaluations update every (patient, state) pair whose BP is not on target simultaneously
+
+    Inputs:
+    pretrtrisk: 10-year risk of CHD and stroke (N x S x E)
+    pretrtsbp, pretrtdbp: pre-treatment SBP and DBP (N x S)
+    targetrisk, targetsbp, targetdbp: risk and BP targets
+    sbpmin, dbpmin: minimum SBP and DBP allowed
+    riskslope: risk slopes of CHD and stroke (N x E)
+    numtrt: maximum number of medications
+    healthy: healthy states
+
+    Outputs:
+    policy: number of medications per patient and health state (N x S)
+    """
+
+    # Post-treatment BP of every number of medications (N x S x max(numtrt, 5)+1), including the two agents
+    # considered for stage 2 hypertension
+    pretrtsbp = np.asarray(pretrtsbp, dtype=float); pretrtdbp = np.asarray(pretrtdbp, dtype=float)
+    sbptable = sbp_reductions_generic_table(pretrtsbp, max(numtrt, 5))
+    dbptable = dbp_reductions_generic_table(pretrtdbp, max(numtrt, 5))
+
+    def post_trt(trt):
+        sbpreduc = take_reductions(sbptable, trt); dbpreduc = take_reductions(dbptable, trt)
+        infeasible = (pretrtsbp - sbpreduc < sbpmin) | (sbpreduc < 0) | (pretrtdbp - dbpreduc < dbpmin) | (dbpreduc < 0)
+        return pretrtsbp - sbpreduc, pretrtdbp - dbpreduc, infeasible
+
+    # Post-treatment risk and BP without treatment
+    past_trt = np.zeros(pretrtsbp.shape)
+    post_trt_risk = post_treatment_risk(sbptable[..., :1], np.asarray(riskslope)[:, None, :], pretrtrisk).sum(axis=2)
+    post_trt_sbp, post_trt_dbp, _ = post_trt(past_trt)
+
+    # Guideline recommendations
+    history = ~np.isin(np.arange(pretrtsbp.shape[1]), healthy)[None, :]  # history of ASCVD
+    high_risk = (((post_trt_risk >= targetrisk) | history) & ((post_trt_sbp >= 130) | (post_trt_dbp >= 80))) | \
+                (((post_trt_sbp >= 140) | (post_trt_dbp >= 90)) & (post_trt_sbp < targetsbp+20) & (post_trt_dbp < targetdbp+10))  # High risk (or history of ASCVD) with stage 1 hypertension or stage 2 hypertension with BP within 20/10 mm Hg of target
+    stage2 = ~high_risk & ((post_trt_sbp >= targetsbp+20) | (post_trt_dbp >= targetdbp+10))  # Stage 2 hypertension and 20/10 mm Hg above target
+    policy = np.where(high_risk | stage2, np.nan, past_trt)  # BP already on target keeping past year's treatment
+
+    # Simulating 1-month evaluations within each year
+    for month in range(12):
+        active = (high_risk | stage2) & ((post_trt_sbp >= targetsbp) | (post_trt_dbp >= targetdbp))  # BP not on target
+        if not active.any():
+            break
+
+        # Attempting to increase treatment (patients with stage 2 hypertension should be treated with at least two agents)
+        new_trt = np.where(past_trt + 1 > numtrt, past_trt, np.where(stage2 & (past_trt < 2), 2, past_trt + 1))
+        new_sbp, new_dbp, new_infeasible = post_trt(new_trt)
+
+        # Considering less intensive treatment if the new treatment is not feasible (stage 2 hypertension only)
+        alt_trt = new_trt - 1
+        alt_sbp, alt_dbp, alt_infeasible = post_trt(alt_trt)
+        use_alt = stage2 & new_infeasible
+
+        # Keeping the past treatment if no treatment considered is feasible (BP of the last treatment considered carries over)
+        trt = np.where(use_alt, np.where(alt_infeasible, past_trt, alt_trt), np.where(new_infeasible, past_trt, new_trt))
+        policy = np.where(active, trt, policy)
+        past_trt = np.where(active, trt, past_trt)
+        post_trt_sbp = np.where(active, np.where(use_alt, alt_sbp, new_sbp), post_trt_sbp)
+        post_trt_dbp = np.where(active, np.where(use_alt, alt_dbp, new_dbp), post_trt_dbp)
+
+    return policy
@@ -2,6 +2,9 @@
 # Calculating ASCVD risk
 # ========================
 
+# Loading modules
+import numpy as np
+
 def arisk(event, sex, race, age, sbp, smk, tc, hdl, diab, trt, time):
     # ASCVD risk calculator (2013 ACC/AHA Guideline)
     # inputs: type of risk to calculate (0=CHD, 1=stroke), sex (1=male, 0=female),
@@ -141,3 +144,73 @@ def arisk(event, sex, race, age, sbp, smk, tc, hdl, diab, trt, time):
     risk = eventprop[event]*(1-basesurv**(math.exp(indivz-meanz)))
 
     return risk
+
+# =========================
+# Batch ASCVD risk calculations
+# ========================
+
+# Coefficient table indexed by [sex, race, trt] (sex: 1=male, 0=female; race: 1=white, 0=black;
+# trt: 1=treated SBP, 0=untreated SBP). Columns follow ASCVD_COEF_NAMES.
+ASCVD_COEF_NAMES = ["b_age", "b_age2", "b_tc", "b_age_tc", "b_hdl", "b_age_hdl", "b_sbp", "b_age_sbp",
+                    "b_smk", "b_age_smk", "b_diab"]
+ASCVD_COEFS = np.empty((2, 2, 2, len(ASCVD_COEF_NAMES)))
+ASCVD_COEFS[1, 1, 0] = [12.344, 0, 11.853, -2.664, -7.990, 1.769, 1.764, 0, 7.837, -1.795, 0.658]  # white male
+ASCVD_COEFS[1, 1, 1] = [12.344, 0, 11.853, -2.664, -7.990, 1.769, 1.797, 0, 7.837, -1.795, 0.658]
+ASCVD_COEFS[1, 0, 0] = [2.469, 0, 0.302, 0, -0.307, 0, 1.809, 0, 0.549, 0, 0.645]  # black male
+ASCVD_COEFS[1, 0, 1] = [2.469, 0, 0.302, 0, -0.307, 0, 1.916, 0, 0.549, 0, 0.645]
+ASCVD_COEFS[0, 1, 0] = [-29.799, 4.884, 13.540, -3.114, -13.578, 3.149, 1.957, 0, 7.574, -1.665, 0.661]  # white female
+ASCVD_COEFS[0, 1, 1] = [-29.799, 4.884, 13.540, -3.114, -13.578, 3.149, 2.019, 0, 7.574, -1.665, 0.661]
+ASCVD_COEFS[0, 0, 0] = [17.114, 0, 0.940, 0, -18.920, 4.475, 27.820, -6.087, 0.691, 0, 0.874]  # black female
+ASCVD_COEFS[0, 0, 1] = [17.114, 0, 0.940, 0, -18.920, 4.475, 29.291, -6.432, 0.691, 0, 0.874]
+
+# Mean linear predictor indexed by [sex, race]
+ASCVD_MEANZ = np.array([[86.61, -29.18],
+                        [19.54, 61.18]])
+
+# Baseline survival indexed by [sex, race, time index] (time index follows ASCVD_TIMES)
+ASCVD_TIMES = (1, 5, 10)
+ASCVD_BASESURV = np.array([[[0.99834, 0.98194, 0.9533], [0.99828, 0.98898, 0.9665]],
+                           [[0.99066, 0.95726, 0.8954], [0.99358, 0.96254, 0.9144]]])
+
+# Proportion of ascvd assumed to be CHD or stroke, respectively
+ASCVD_EVENTPROP = np.array([0.6, 0.4])
+
+def arisk_batch(events, sex, race, age, sbp, smk, tc, hdl, diab, trt=0, times=(1, 10)):
+    """
+    Vectorized ASCVD risk calculator (2013 ACC/AHA Guideline)
+
+    Inputs:
+    events: event types to calculate (0=CHD, 1=stroke), array (E,)
+    sex, race, age, sbp, smk, tc, hdl, diab: patient characteristics, arrays (N,) with the same
+        coding as arisk (e.g., columns of the NHANES forecasted dataset)
+    trt: 1=BP reported is on treatment, 0=BP reported is untreated (scalar or array (N,))
+    times: risk horizons in years, array (T,) with values in ASCVD_TIMES
+
+    Outputs:
+    risk: likelihood of each event in the next "time" years, array (N, E, T)
+    """
+
+    events = np.atleast_1d(np.asarray(events, dtype=int))
+    times = np.atleast_1d(np.asarray(times, dtype=int))
+    if not np.isin(times, ASCVD_TIMES).all():
+        raise ValueError(str(times[~np.isin(times, ASCVD_TIMES)][0])+" is an improper time length for risk calculation")
+    time_index = np.searchsorted(ASCVD_TIMES, times)
+
+    # Selecting coefficients per patient
+    sex = np.atleast_1d(np.asarray(sex, dtype=int)); race = np.atleast_1d(np.asarray(race, dtype=int))
+    trt = np.broadcast_to(np.asarray(trt, dtype=int), sex.shape)
+    b = ASCVD_COEFS[sex, race, trt]  # (N, coefficients)
+
+    # Calculating linear predictor
+    lage = np.log(np.asarray(age, dtype=float)); ltc = np.log(np.asarray(tc, dtype=float))
+    lhdl = np.log(np.asarray(hdl, dtype=float)); lsbp = np.log(np.asarray(sbp, dtype=float))
+    smk = np.asarray(smk, dtype=float); diab = np.asarray(diab, dtype=float)
+    indivz = b[:, 0]*lage+b[:, 1]*lage**2+b[:, 2]*ltc+b[:, 3]*lage*ltc+b[:, 4]*lhdl+b[:, 5]*lage*lhdl+\
+             b[:, 6]*lsbp+b[:, 7]*lage*lsbp+b[:, 8]*smk+b[:, 9]*lage*smk+b[:, 10]*diab
+
+    # Risk by event and time
+    basesurv = ASCVD_BASESURV[sex, race][:, time_index]  # (N, T)
+    survival = basesurv**np.exp(indivz-ASCVD_MEANZ[sex, race])[:, None]  # (N, T)
+    risk = ASCVD_EVENTPROP[events][None, :, None]*(1-survival)[:, None, :]
+
+    return risk
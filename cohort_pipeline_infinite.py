@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# =======================================================
+# Streaming cohort pipeline - Infinite Horizon Hypertension treatment case study (No Gurobi Version)
+# =======================================================
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Loading modules
+import time  # wall clock
+import traceback  # error reports
+import numpy as np  # array operations
+from patient_simulation_infinite_no_gurobi import patient_sim_infinite_no_gurobi, cohort_risks_infinite, \
+    cohort_transitions_infinite, feasible_guidelines_infinite, solve_patient_infinite, patient_mdp_infinite  # stages of the patient simulation
+from policy_evaluation_infinite import PolicyEvaluationContext  # batched policy evaluation
+from drug_combinations import meds_to_actions, feasible_meds_mask, project_feasible_meds  # treatment options per number of medications
+from aha_2017_guideline_infinite import aha_guideline_batch  # guideline policies of a chunk of patients
+from risk_based_policy_infinite import risk_policy_batch  # risk-based policies of a chunk of patients
+from cohort_runner_infinite import load_lookup_tables, cohort_parameters  # case study data and parameters
+from cohort_results_infinite import CohortResults  # columnar result storage
+from life_tables import LifeTables  # age-indexed lookup arrays
+from nhanes_cache import load_nhanes_cache, NHANES_CSV, NHANES_CACHE_DIR  # patient data cache
+from stage_timing import StageTimer, timed  # per-stage wall time
+
+# Model parameters used by solve_patient_infinite (the rest only enter the risk and transition stages)
+SOLVE_PARAMETERS = ["numhealth", "healthy", "dead", "event_states", "sbpmin", "dbpmin", "alldrugs", "trtharm", "QoL",
+                    "alpha", "gamma", "state_order", "S_class", "action_order", "A_class", "action_class_meds",
+                    "targetrisk", "targetdiff", "targetsbp", "targetdbp", "numeds", "eval_sweeps"]
+
+# Stage 1: loading patients in chunks
+def load_chunks(cache, pt_ids, chunk_size, reference_age_index=0):
+    """
+    Read the reference-age rows of chunk_size patients at a time from the memory-mapped cache
+
+    Outputs (generator):
+    chunk: dictionary with the patient ids (pt_ids) and their reference-age rows (refdata)
+    """
+
+    for start in range(0, len(pt_ids), chunk_size):
+        chunk = {"pt_ids": np.asarray(pt_ids[start:start+chunk_size])}
+        try:
+            chunk["refdata"] = cache.reference_rows(chunk["pt_ids"], reference_age_index)
+        except Exception as e:
+            chunk["error"] = e
+        yield chunk
+
+# Stage 2: risk estimates of every patient in a chunk
+def compute_risks(chunks, params, timer=None):
+    """Add the scaled 1-year and 10-year risks (periodrisk1, periodrisk10) of every patient to each chunk"""
+
+    for chunk in chunks:
+        if "error" not in chunk:
+            try:
+                with timed(timer, "risks"):
+                    chunk["periodrisk1"], chunk["periodrisk10"] = cohort_risks_infinite(
+                        chunk["refdata"], params["numhealth"], params["events"], params["stroke_hist"],
+                        params["ascvd_hist"])
+            except Exception as e:
+                chunk["error"] = e
+        yield chunk
+
+# Stage 3: transition probabilities of every patient in a chunk
+def build_transitions(chunks, params, lifetables, compact=False, dtype=np.float64, timer=None):
+    """Add the transition probabilities (P), feasibility indicators (feas), pre-treatment BP (pretrtsbp, pretrtdbp),
+    risk slopes (riskslope), and reference ages (age) of every patient to each chunk,
+    dropping the inputs that are no longer needed (P is stored as CompactTransitions of type dtype if compact)"""
+
+    for chunk in chunks:
+        if "error" not in chunk:
+            try:
+                refdata = chunk.pop("refdata")
+                with timed(timer, "transitions"):
+                    chunk["P"], chunk["feas"], chunk["pretrtsbp"], chunk["pretrtdbp"], chunk["riskslope"] = \
+                        cohort_transitions_infinite(refdata, chunk.pop("periodrisk1"), lifetables, params["numhealth"],
+                                                    params["sbpmin"], params["dbpmin"], params["sbpmax"],
+                                                    params["dbpmax"], params["alldrugs"], compact, dtype)
+                chunk["age"] = refdata.age.to_numpy()
+            except Exception as e:
+                chunk["error"] = e
+        yield chunk
+
+# Stage 4: guideline policies of every patient in a chunk
+def compute_guidelines(chunks, params, timer=None):
+    """Add the AHA guideline and risk-based policies of every patient, projected onto feasible treatment options,
+    to each chunk (guidelines: outputs of feasible_guidelines_infinite, with one row per patient)"""
+
+    for chunk in chunks:
+        if "error" not in chunk:
+            try:
+                with timed(timer, "guideline policies"):
+                    pi_aha = aha_guideline_batch(chunk["periodrisk10"], chunk["pretrtsbp"], chunk["pretrtdbp"],
+                                                 params["targetrisk"], params["targetsbp"], params["targetdbp"],
+                                                 params["sbpmin"], params["dbpmin"], chunk["riskslope"],
+                                                 params["numeds"], params["healthy"])
+                    pi_risk = risk_policy_batch(chunk["periodrisk10"], chunk["pretrtsbp"], chunk["pretrtdbp"],
+                                                params["targetrisk"], params["targetdiff"], params["sbpmin"],
+                                                params["dbpmin"], chunk["riskslope"], params["numeds"])
+                with timed(timer, "feasibility projection"):
+                    feas = chunk["feas"][:, params["state_order"]][:, :, params["action_order"]]  # as in patient_mdp_infinite
+                    chunk["guidelines"] = feasible_guidelines_infinite(pi_aha, pi_risk, feas, params["action_class_meds"],
+                                                                       params["numeds"])
+            except Exception as e:
+                chunk["error"] = e
+        yield chunk
+
+# Stage 5: policies and their evaluation for every patient in a chunk
+def solve_chunks(chunks, params, tables, lifetables, cache, warm_start=False, seed=None, timer=None):
+    """
+    Determine and evaluate the policies of every patient in each chunk
+
+    Chunks whose vectorized stages failed (e.g., a patient outside the range of the lookup tables) are
+    rerun one patient at a time with patient_sim_infinite_no_gurobi, so only the failing patients are lost
+
+    Outputs (generator):
+    results: list of result tuples of patient_sim_infinite_no_gurobi per chunk (None for patients that failed)
+    """
+
+    solve_params = {name: params[name] for name in SOLVE_PARAMETERS if name in params}
+    pi_init = None
+    for chunk in chunks:
+        results = []
+        for i, pt_id in enumerate(chunk["pt_ids"]):
+            rng = None if seed is None else np.random.default_rng([seed, pt_id])
+            try:
+                if "error" in chunk:
+                    result = patient_sim_infinite_no_gurobi(pt_id, cache.patient(pt_id), verbose=False,
+                                                            lifetables=lifetables, pi_init=pi_init, rng=rng,
+                                                            timer=timer, **tables, **params)
+                else:
+                    result = solve_patient_infinite(pt_id, chunk["P"][i], chunk["feas"][i], chunk["periodrisk10"][i],
+                                                    chunk["pretrtsbp"][i], chunk["pretrtdbp"][i], chunk["riskslope"][i],
+                                                    chunk["age"][i], verbose=False, pi_init=pi_init, rng=rng,
+                                                    guidelines=[g[i] for g in chunk["guidelines"]],
+                                                    timer=timer, **solve_params)
+            except Exception as e:
+                print(f"Error processing patient {pt_id}: {str(e)}")
+                print(f"Error type: {type(e).__name__}")
+                traceback.print_exc()
+                result = None
+            if warm_start and result is not None:
+                pi_init = result[4]  # optimal policy
+            results.append(result)
+        chunk.clear()  # releasing the chunk's transition probabilities before the next chunk is built
+        yield results
+
+# Streaming the patient simulation over a cohort of patients
+def run_cohort_pipeline(pt_ids=None, tables=None, params=None, chunk_size=256, csv_path=NHANES_CSV,
+                        cache_dir=NHANES_CACHE_DIR, warm_start=False, seed=None, compact=False, dtype=np.float64,
+                        timer=None):
+    """
+    Run the patient simulation as a chain of generators (load chunk of patients -> compute risks ->
+    build transition probabilities -> guideline policies -> solve and evaluate policies), one chunk of patients at a time
+
+    Risks and transition probabilities are computed for a whole chunk at once, and only one chunk is held
+    in memory, so peak memory grows with chunk_size rather than with the cohort size
+    (each patient's transition probabilities take numhealth**2 x len(alldrugs) x 8 bytes, about 200 KB
+    with the combination action space, or about 36 KB with compact=True and dtype=np.float32)
+
+    Inputs:
+    pt_ids: patient ids to simulate (default: every patient in the dataset)
+    tables: output of load_lookup_tables (loaded if not provided)
+    params: keyword arguments for patient_sim_infinite_no_gurobi (default: cohort_parameters())
+    chunk_size: number of patients processed together
+    csv_path, cache_dir: NHANES forecasted dataset and its memory-mapped cache (built if needed)
+    warm_start: whether to warm start the policy search of each patient with the optimal policy of the previous patient
+    seed: seed of the random initial policies (default: deterministic greedy initial policies)
+    compact: whether to store transition probabilities as CompactTransitions
+    dtype: floating point type of the stored transition probabilities
+    timer: StageTimer where the wall time of each stage is accumulated (the risk, transition, and guideline
+        stages are timed once per chunk, the other stages once per patient)
+
+    Outputs (generator):
+    result tuples of patient_sim_infinite_no_gurobi (None for patients that failed), in the order of pt_ids
+    """
+
+    if tables is None:
+        tables = load_lookup_tables()
+    if params is None:
+        params = cohort_parameters()
+    lifetables = LifeTables(**tables)
+    cache = load_nhanes_cache(csv_path, cache_dir)
+    if pt_ids is None:
+        pt_ids = cache.ids
+
+    chunks = load_chunks(cache, pt_ids, chunk_size, params.get("reference_age_index", 0))
+    chunks = compute_risks(chunks, params, timer)
+    chunks = build_transitions(chunks, params, lifetables, compact, dtype, timer)
+    chunks = compute_guidelines(chunks, params, timer)
+    for results in solve_chunks(chunks, params, tables, lifetables, cache, warm_start, seed, timer):
+        yield from results
+
+# Evaluating risk-based policies over a grid of risk thresholds
+def sweep_risk_thresholds(thresholds, pt_ids=None, tables=None, params=None, chunk_size=256, csv_path=NHANES_CSV,
+                          cache_dir=NHANES_CACHE_DIR):
+    """
+    Risk-based policies and their QALYs for every risk threshold and patient, streaming chunks of patients
+    through the risk and transition probability stages once for all thresholds
+
+    The policies of every threshold are generated in one call per chunk (risk_policy_batch), and each patient's
+    policies are evaluated together, factorising each distinct policy once (PolicyEvaluationContext)
+
+    Inputs:
+    thresholds: risk thresholds (T,) replacing targetrisk (e.g., np.arange(0.05, 0.2001, 0.005))
+    pt_ids, tables, params, chunk_size, csv_path, cache_dir: as in run_cohort_pipeline
+
+    Outputs:
+    sweep: dictionary with the thresholds (T,), patient ids (N,), risk-based policies d_risk (T x N x S)
+        in the order of alldrugs (-1 for patients that failed), value functions V_risk (T x N x S),
+        expected discounted QALYs J_risk (T x N), and number of states repaired to a feasible number of medications
+        (T x N, -1 for patients that failed)
+    """
+
+    if tables is None:
+        tables = load_lookup_tables()
+    if params is None:
+        params = cohort_parameters()
+    lifetables = LifeTables(**tables)
+    cache = load_nhanes_cache(csv_path, cache_dir)
+    if pt_ids is None:
+        pt_ids = cache.ids
+    thresholds = np.asarray(thresholds, dtype=float)
+    T, N, S = len(thresholds), len(pt_ids), params["numhealth"]
+
+    sweep = {"thresholds": thresholds, "pt_ids": np.asarray(pt_ids), "d_risk": np.full((T, N, S), -1, dtype=np.int64),
+             "V_risk": np.full((T, N, S), np.nan), "J_risk": np.full((T, N), np.nan),
+             "repairs": np.full((T, N), -1, dtype=np.int64)}
+    alpha = np.asarray(params["alpha"])[params["state_order"]]
+    action_order = np.array(params["action_order"])
+
+    chunks = load_chunks(cache, pt_ids, chunk_size, params.get("reference_age_index", 0))
+    chunks = compute_risks(chunks, params)
+    chunks = build_transitions(chunks, params, lifetables)
+    start = 0
+    for chunk in chunks:
+        pt_chunk = chunk["pt_ids"]
+        if "error" in chunk:
+            print(f"Error processing patients {pt_chunk[0]} to {pt_chunk[-1]}: {str(chunk['error'])}")
+            start += len(pt_chunk)
+            continue
+
+        # Risk-based policies of every threshold (T x n x S)
+        pi_risk = risk_policy_batch(chunk["periodrisk10"], chunk["pretrtsbp"], chunk["pretrtdbp"], thresholds,
+                                    params["targetdiff"], params["sbpmin"], params["dbpmin"], chunk["riskslope"],
+                                    params["numeds"])
+
+        for i, pt_id in enumerate(pt_chunk):
+            try:
+                P, feas, r = patient_mdp_infinite(chunk["P"][i], chunk["feas"][i], chunk["age"][i], S, params["alldrugs"],
+                                                  params["trtharm"], params["QoL"], params["state_order"], action_order)
+                meds_mask = feasible_meds_mask(feas, params["action_class_meds"], params["numeds"])
+                pi_feas, repairs = project_feasible_meds(pi_risk[:, i], meds_mask)  # every threshold at once
+                d_risk = meds_to_actions(pi_feas, params["action_class_meds"], feas)
+                V_risk = PolicyEvaluationContext(P, params["gamma"], {"qaly": r}).evaluate(d_risk)["qaly"]
+            except Exception as e:
+                print(f"Error processing patient {pt_id}: {str(e)}")
+                continue
+            sweep["d_risk"][:, start+i] = action_order[d_risk]
+            sweep["V_risk"][:, start+i] = V_risk
+            sweep["J_risk"][:, start+i] = V_risk @ alpha
+            sweep["repairs"][:, start+i] = repairs
+        start += len(pt_chunk)
+        chunk.clear()
+
+    return sweep
+
+# Writing streamed results to the columnar result store
+def write_results(results, store, wts=None):
+    """
+    Append streamed result tuples to a CohortResults store
+
+    Inputs:
+    results: iterable of result tuples (e.g., run_cohort_pipeline)
+    store: CohortResults
+    wts: dictionary of sampling weights per patient id
+
+    Outputs:
+    failed: number of patients that failed
+    """
+
+    failed = 0
+    for result in results:
+        if result is None:
+            failed += 1
+        else:
+            store.append(result, np.nan if wts is None else wts[result[0]])
+
+    return failed
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream the infinite horizon case study over the NHANES cohort")
+    parser.add_argument("--patients", type=int, default=None, help="number of patients to simulate (default: all)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="patients processed together")
+    parser.add_argument("--combinations", action="store_true",
+                        help="consider every combination of up to 5 medications as treatment options")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="warm start each policy search with the previous patient's optimal policy")
+    parser.add_argument("--eval-sweeps", type=int, default=None,
+                        help="evaluation sweeps per improvement (modified policy iteration; default: full evaluation)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of random initial policies (default: deterministic greedy initial policies)")
+    parser.add_argument("--compact", action="store_true",
+                        help="store transition probabilities as structured-sparse float32 arrays")
+    parser.add_argument("--profile", action="store_true", help="print the wall time and calls of each stage")
+    parser.add_argument("--profile-json", default=None,
+                        help="path of the .json file where the wall time and calls of each stage are saved")
+    parser.add_argument("--output", default=None, help="path of the .npz file where results are saved")
+    args = parser.parse_args()
+
+    cache = load_nhanes_cache()
+    pt_ids = cache.ids
+    if args.patients is not None:
+        pt_ids = pt_ids[:args.patients]
+
+    print(f"Simulating {len(pt_ids)} patients in chunks of {args.chunk_size}...")
+    start = time.time()
+    params = cohort_parameters(args.combinations)
+    params["eval_sweeps"] = args.eval_sweeps
+    results = CohortResults(len(pt_ids), params["numhealth"], len(params["alldrugs"]))
+    timer = StageTimer() if args.profile or args.profile_json is not None else None
+    failed = write_results(run_cohort_pipeline(pt_ids, params=params, chunk_size=args.chunk_size,
+                                               warm_start=args.warm_start, seed=args.seed, compact=args.compact,
+                                               dtype=np.float32 if args.compact else np.float64, timer=timer),
+                           results, dict(zip(cache.ids, cache.first_rows('wt'))))
+
+    print(f"✅ {len(results)} patients simulated in {time.time()-start:.1f} s ({failed} failed)")
+    if timer is not None:
+        print("Wall time per stage:")
+        print(timer.summary())
+        if args.profile_json is not None:
+            timer.save_json(args.profile_json)
+            print(f"Stage timings saved to {args.profile_json}")
+    if args.output is not None:
+        results.save(args.output)
+        print(f"Results saved to {args.output}")
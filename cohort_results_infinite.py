@@ -0,0 +1,92 @@
+# =======================================================
+# Columnar storage of per-patient policy outputs (Infinite Horizon)
+# =======================================================
+
+# Loading modules
+import numpy as np  # array operations
+
+# Outputs of patient_sim_infinite_no_gurobi in tuple order, with the type of column used to store them:
+# "id" (patient id), "state" (array per health state), "policy" (action per health state),
+# "occupancy" (array per health state and action), "scalar" (one value per patient), "count" (one integer per
+# patient), or None (not stored)
+RESULT_FIELDS = [("pt_id", "id"), ("V_notrt", "state"), ("e_notrt", "state"),
+                 ("V_opt", "state"), ("d_opt", "policy"), ("occup", "occupancy"), ("J_opt", "scalar"),
+                 ("V_mopt", "state"), ("d_mopt", "policy"), ("J_mopt", "scalar"),
+                 ("V_aha", "state"), ("d_aha", "policy"), ("J_aha", "scalar"), ("e_aha", "state"),
+                 ("V_risk", "state"), ("d_risk", "policy"), ("J_risk", "scalar"), ("e_risk", "state"),
+                 ("e_opt", "state"), ("e_mopt", "state"),
+                 ("ly_notrt", "state"), ("ly_opt", "state"), ("ly_mopt", "state"), ("ly_aha", "state"), ("ly_risk", "state"),
+                 ("repairs_aha", "count"), ("repairs_risk", "count")]  # guideline states with an infeasible number of medications
+
+class CohortResults:
+    """
+    Preallocated, typed columns holding the outputs of patient_sim_infinite_no_gurobi for a cohort
+
+    Columns are NumPy arrays with one row per patient: value functions, expected events and life-years
+    have shape (N, numhealth), policies (N, numhealth) as integers, occupancy measures
+    (N, numhealth, numtrt) if numtrt is given (not stored otherwise), and objective values,
+    patient ids, repair counts (as integers), and sampling weights (wt) have shape (N,)
+    """
+
+    def __init__(self, numpatients, numhealth, numtrt=None):
+        self.numhealth = numhealth
+        self.numtrt = numtrt
+        self.size = 0  # number of patients stored so far
+        self.columns = {"wt": np.full(numpatients, np.nan)}
+        for name, kind in RESULT_FIELDS:
+            if kind in ("id", "count"):
+                self.columns[name] = np.full(numpatients, -1, dtype=np.int64)
+            elif kind == "state":
+                self.columns[name] = np.full((numpatients, numhealth), np.nan)
+            elif kind == "policy":
+                self.columns[name] = np.full((numpatients, numhealth), -1, dtype=np.int64)
+            elif kind == "occupancy" and numtrt is not None:
+                self.columns[name] = np.full((numpatients, numhealth, numtrt), np.nan)
+            elif kind == "scalar":
+                self.columns[name] = np.full(numpatients, np.nan)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        return self.columns[name][:self.size]
+
+    def append(self, result, wt=np.nan):
+        """
+        Store the result tuple of one patient (results of failed patients, i.e., None, are skipped)
+
+        Outputs:
+        stored: whether the result was stored
+        """
+
+        if result is None:
+            return False
+        if self.size == len(self.columns["wt"]):
+            raise IndexError(f"Result store is full ({self.size} patients)")
+
+        for (name, kind), value in zip(RESULT_FIELDS, result):
+            if name in self.columns:
+                self.columns[name][self.size] = value
+        self.columns["wt"][self.size] = wt
+        self.size += 1
+
+        return True
+
+    def save(self, path):
+        """Save the stored columns to a single (compressed) .npz file"""
+
+        np.savez_compressed(path, numhealth=self.numhealth, numtrt=-1 if self.numtrt is None else self.numtrt,
+                            **{name: self[name] for name in self.columns})
+
+    @classmethod
+    def load(cls, path):
+        """Load columns saved with CohortResults.save"""
+
+        with np.load(path) as data:
+            numtrt = int(data["numtrt"]) if "numtrt" in data else -1
+            store = cls(len(data["wt"]), int(data["numhealth"]), None if numtrt < 0 else numtrt)
+            for name in store.columns:
+                store.columns[name] = data[name]
+            store.size = len(data["wt"])
+
+        return store
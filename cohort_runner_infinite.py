@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# =======================================================
+# Cohort runner - Infinite Horizon Hypertension treatment case study (No Gurobi Version)
+# =======================================================
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Loading modules
+import time  # wall clock
+from concurrent.futures import ProcessPoolExecutor, as_completed  # parallel computing
+import numpy as np  # array operations
+import pandas as pd  # data manipulation
+from patient_simulation_infinite_no_gurobi import patient_sim_infinite_no_gurobi
+from cohort_results_infinite import CohortResults  # columnar result storage
+from life_tables import LifeTables  # age-indexed lookup arrays
+from drug_combinations import drug_combinations, meds_per_action, action_classes_by_meds  # treatment options
+from nhanes_cache import NHANESCache, load_nhanes_cache, NHANES_CSV, NHANES_CACHE_DIR  # patient data cache
+from stage_timing import StageTimer  # per-stage wall time
+
+# Location of the case study data
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Data')
+
+# Loading life expectancy, death likelihood, and risk slope data
+def load_lookup_tables(datadir=DATA_DIR):
+    """
+    Load the lookup tables used in the case study
+
+    Outputs:
+    tables: dictionary with lifedata, strokedeathdata, chddeathdata, alldeathdata and riskslopedata
+    """
+
+    tables = {"lifedata": pd.read_csv(os.path.join(datadir, 'lifedata.csv'), header=None),
+              "strokedeathdata": pd.read_csv(os.path.join(datadir, 'strokedeathdata.csv'), header=None),
+              "chddeathdata": pd.read_csv(os.path.join(datadir, 'chddeathdata.csv'), header=None),
+              "alldeathdata": pd.read_csv(os.path.join(datadir, 'alldeathdata.csv'), header=None),
+              "riskslopedata": pd.read_csv(os.path.join(datadir, 'riskslopes.csv'), header=None)}
+
+    return tables
+
+# Case study parameters (same as test_infinite_horizon_with_data.py)
+def cohort_parameters(combinations=False):
+    """
+    Model parameters passed to patient_sim_infinite_no_gurobi for every patient
+
+    Inputs:
+    combinations: whether treatment options are every combination of up to 5 medications
+        from the 5 drug classes (instead of single drugs)
+
+    Outputs:
+    params: dictionary of keyword arguments (excluding patient id, patient data, and lookup tables)
+    """
+
+    # Set up parameters
+    numhealth = 10
+    events = 2
+    numeds = 5
+
+    # Treatment options
+    if combinations:
+        alldrugs = drug_combinations(max_meds=numeds)  # combinations of up to numeds medications
+        trtharm = list(0.002*meds_per_action(alldrugs))  # disutility per medication
+        action_class_meds = action_classes_by_meds(alldrugs, numeds)
+        A_class = action_class_meds  # treatment options ordered by number of medications
+    else:
+        drugs = ["ACE", "ARB", "BB", "CCB", "TH"]
+        drugs.insert(0, "NT")  # no treatment
+        alldrugs = drugs  # single drug actions
+        trtharm = [0, 0.002, 0.002, 0.002, 0.002, 0.002]
+        action_class_meds = [[a] for a in range(numeds+1)]
+        A_class = [[a] for a in range(len(alldrugs))]
+
+    # QoL parameters
+    QoL = {"40-44": [1, 0.9348, 0.8835, 0.9348*0.8835, 0.8970*(1/12)+0.9348*(11/12), 0.8662*(1/12)+0.8835*(11/12), 0, 0, 0, 0],
+           "45-54": [1, 0.9374, 0.8835, 0.9374*0.8835, 0.8862*(1/12)+0.9374*(11/12), 0.8662*(1/12)+0.8835*(11/12), 0, 0, 0, 0],
+           "55-64": [1, 0.9376, 0.8835, 0.9376*0.8835, 0.8669*(1/12)+0.9376*(11/12), 0.8662*(1/12)+0.8835*(11/12), 0, 0, 0, 0],
+           "65-74": [1, 0.9372, 0.8835, 0.9372*0.8835, 0.8351*(1/12)+0.9372*(11/12), 0.8662*(1/12)+0.8835*(11/12), 0, 0, 0, 0],
+           "75-84": [1, 0.9364, 0.8835, 0.9363*0.8835, 0.7946*(1/12)+0.9363*(11/12), 0.8662*(1/12)+0.8835*(11/12), 0, 0, 0, 0]}
+
+    QoLterm = {"40-44": [1, 0.9348, 0.8835, 0.9348*0.8835, 0.9348, 0.8835, 0, 0, 0, 0],
+               "45-54": [1, 0.9374, 0.8835, 0.9374*0.8835, 0.9374, 0.8835, 0, 0, 0, 0],
+               "55-64": [1, 0.9376, 0.8835, 0.9376*0.8835, 0.9376, 0.8835, 0, 0, 0, 0],
+               "65-74": [1, 0.9372, 0.8835, 0.9372*0.8835, 0.9372, 0.8835, 0, 0, 0, 0],
+               "75-84": [1, 0.9364, 0.8835, 0.9363*0.8835, 0.9364, 0.8835, 0, 0, 0, 0]}
+
+    # Mortality rates
+    mortality_rates = {"Males <2 CHD events": [1, 1/1.6, 1/2.3, (1/1.6)*(1/2.3), 1/1.6, 1/2.3, 0, 0, 0, 0],
+                       "Females <2 CHD events": [1, 1/2.1, 1/2.3, (1/2.1)*(1/2.3), 1/2.1, 1/2.3, 0, 0, 0, 0]}
+
+    # State parameters
+    stroke_hist = [2, 3, 5]
+    dead = [6, 7, 8, 9]
+    ascvd_hist = np.ones((numhealth, events))
+    ascvd_hist[stroke_hist, 1] = 3  # Stroke history multiplier
+    ascvd_hist[dead, :] = 0
+
+    # Initial state distribution
+    alpha = np.zeros(numhealth)
+    alpha[0] = 1  # Start in healthy state
+
+    params = {"numhealth": numhealth, "healthy": [0], "dead": dead, "events": events,
+              "stroke_hist": stroke_hist, "ascvd_hist": ascvd_hist,
+              "event_states": [0, 0, 0, 0, 1, 1, 0, 0, 0, 0],  # Events in states 4,5
+              "mortality_rates": mortality_rates,
+              "sbpmin": 120, "dbpmin": 55, "sbpmax": 150, "dbpmax": 90,  # Treatment parameters
+              "alldrugs": alldrugs, "trtharm": trtharm,
+              "QoL": QoL, "QoLterm": QoLterm, "alpha": alpha, "gamma": 0.97,
+              "state_order": list(range(numhealth)), "S_class": [[0], [1, 4], [2, 5], [3], [6, 7, 8, 9]],
+              "action_order": list(range(len(alldrugs))), "A_class": A_class, "action_class_meds": action_class_meds,
+              "targetrisk": 0.1, "targetdiff": 0.025, "targetsbp": 130, "targetdbp": 80,  # AHA's guideline parameters
+              "numeds": numeds, "reference_age_index": 0}
+
+    return params
+
+# Data shared by every patient in a worker process (set once by the pool initializer)
+_worker_data = {}
+
+def _init_worker(tables, cache_dir, params, warm_start=False, seed=None, timing=False):
+    """Store lookup tables (and their age-indexed arrays) and model parameters, and open the patient data cache
+    in the worker process"""
+
+    _worker_data["tables"] = tables
+    _worker_data["lifetables"] = LifeTables(**tables)
+    _worker_data["cache"] = NHANESCache(cache_dir)
+    _worker_data["params"] = params
+    _worker_data["warm_start"] = warm_start
+    _worker_data["seed"] = seed
+    _worker_data["timing"] = timing
+
+def _run_shard(pt_ids):
+    """Run the patient simulation on a shard of patient ids in a worker process
+    (warm starting each policy search with the optimal policy of the previous patient if requested)
+
+    With a seed, each patient's random initial policy is drawn from a generator seeded with (seed, pt_id),
+    so results do not depend on how patients are sharded across workers
+
+    Returns the shard's result tuples and, if timing was requested, the per-stage wall time of the shard
+    (StageTimer.as_dict) to be merged in the parent process"""
+
+    tables = _worker_data["tables"]; cache = _worker_data["cache"]; params = _worker_data["params"]
+    lifetables = _worker_data["lifetables"]; seed = _worker_data["seed"]
+
+    timer = StageTimer() if _worker_data["timing"] else None
+
+    results = []
+    pi_init = None
+    for pt_id in pt_ids:
+        result = patient_sim_infinite_no_gurobi(pt_id, cache.patient(pt_id), verbose=False,
+                                                lifetables=lifetables, pi_init=pi_init,
+                                                rng=None if seed is None else np.random.default_rng([seed, pt_id]),
+                                                timer=timer, **tables, **params)
+        if _worker_data["warm_start"] and result is not None:
+            pi_init = result[4]  # optimal policy
+        results.append(result)
+
+    return results, None if timer is None else timer.as_dict()
+
+# Running the patient simulation over a cohort of patients in parallel
+def run_cohort(pt_ids=None, tables=None, params=None, max_workers=None, shard_size=16,
+               csv_path=NHANES_CSV, cache_dir=NHANES_CACHE_DIR, warm_start=False, seed=None, timer=None):
+    """
+    Shard patient ids across a process pool and stream results back as shards complete
+
+    Inputs:
+    pt_ids: patient ids to simulate (default: every patient in the dataset)
+    tables: output of load_lookup_tables (loaded if not provided)
+    params: keyword arguments for patient_sim_infinite_no_gurobi (default: cohort_parameters())
+    max_workers: number of worker processes (default: number of processors)
+    shard_size: number of patients sent to a worker at a time
+    csv_path, cache_dir: NHANES forecasted dataset and its memory-mapped cache (built if needed)
+    warm_start: whether to warm start the policy search of each patient with the optimal policy
+        of the previous patient in its shard
+    seed: seed of the random initial policies (default: deterministic greedy initial policies)
+    timer: StageTimer where the per-stage wall time of every worker is accumulated as shards complete
+
+    Outputs (generator):
+    result tuples of patient_sim_infinite_no_gurobi (None for patients that failed),
+    in order of completion
+    """
+
+    if tables is None:
+        tables = load_lookup_tables()
+    if params is None:
+        params = cohort_parameters()
+    cache = load_nhanes_cache(csv_path, cache_dir)  # workers open the same cache files
+    if pt_ids is None:
+        pt_ids = cache.ids
+    pt_ids = list(pt_ids)
+
+    # Splitting patient ids into shards
+    shards = [pt_ids[i:i+shard_size] for i in range(0, len(pt_ids), shard_size)]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(tables, cache_dir, params, warm_start, seed, timer is not None)) as executor:
+        futures = [executor.submit(_run_shard, shard) for shard in shards]
+        for future in as_completed(futures):
+            results, timings = future.result()
+            if timer is not None:
+                timer.merge(timings)
+            for result in results:
+                yield result
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the infinite horizon case study over the NHANES cohort")
+    parser.add_argument("--patients", type=int, default=None, help="number of patients to simulate (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--shard-size", type=int, default=16, help="patients per task sent to a worker")
+    parser.add_argument("--combinations", action="store_true",
+                        help="consider every combination of up to 5 medications as treatment options")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="warm start each policy search with the previous patient's optimal policy")
+    parser.add_argument("--eval-sweeps", type=int, default=None,
+                        help="evaluation sweeps per improvement (modified policy iteration; default: full evaluation)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of random initial policies (default: deterministic greedy initial policies)")
+    parser.add_argument("--profile", action="store_true", help="print the wall time and calls of each stage")
+    parser.add_argument("--profile-json", default=None,
+                        help="path of the .json file where the wall time and calls of each stage are saved")
+    parser.add_argument("--output", default=None, help="path of the .npz file where results are saved")
+    args = parser.parse_args()
+
+    tables = load_lookup_tables()
+    cache = load_nhanes_cache()
+    pt_ids = cache.ids
+    if args.patients is not None:
+        pt_ids = pt_ids[:args.patients]
+
+    print(f"Simulating {len(pt_ids)} patients...")
+    start = time.time()
+    wts = dict(zip(cache.ids, cache.first_rows('wt')))  # sampling weights
+    params = cohort_parameters(args.combinations)
+    params["eval_sweeps"] = args.eval_sweeps
+    results = CohortResults(len(pt_ids), params["numhealth"], len(params["alldrugs"]))
+    timer = StageTimer() if args.profile or args.profile_json is not None else None
+    completed = 0
+    for result in run_cohort(pt_ids, tables, params, max_workers=args.workers, shard_size=args.shard_size,
+                             warm_start=args.warm_start, seed=args.seed, timer=timer):
+        if result is not None:
+            results.append(result, wts[result[0]])
+        completed += 1
+        if completed % 500 == 0:
+            print(f"  {completed} patients done ({time.time()-start:.1f} s)")
+
+    print(f"✅ {len(results)} patients simulated in {time.time()-start:.1f} s ({completed-len(results)} failed)")
+    if timer is not None:
+        print("Wall time per stage (summed over workers):")
+        print(timer.summary())
+        if args.profile_json is not None:
+            timer.save_json(args.profile_json)
+            print(f"Stage timings saved to {args.profile_json}")
+    if args.output is not None:
+        results.save(args.output)
+        print(f"Results saved to {args.output}")
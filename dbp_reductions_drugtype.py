@@ -104,3 +104,57 @@ def dbp_reductions_generic(trt, pretreatment):
         reduction = np.nan
 
     return reduction
+
+# Standard-dose DBP drop of each drug class at a pre-treatment DBP of DBP_REFERENCE,
+# in the order drug classes are applied in dbp_reductions
+DBP_DRUG_ORDER = ['TH', 'BB', 'ACE', 'ARB', 'CCB']
+DBP_DRUG_DROP = np.array([4.4, 6.7, 4.7, 5.7, 5.9])
+DBP_REFERENCE = 97
+DBP_SLOPE = 0.11  # additional drop per mmHg of DBP
+
+# Calculating DBP reductions for arrays of drug counts (closed form of dbp_reductions)
+def dbp_reductions_array(counts, pretreatment):
+    """
+    Each standard dose reduces DBP by drop + DBP_SLOPE*(current DBP - DBP_REFERENCE), so n doses of
+    the same class applied to a reduction r give (1-DBP_SLOPE)**n*r plus a geometric series
+
+    Inputs:
+    counts: number of standard doses of each drug class in DBP_DRUG_ORDER, array (..., 5)
+    pretreatment: pre-treatment DBP, array broadcastable to counts[..., 0]
+
+    Outputs:
+    dbp_reduc: DBP reductions, same order of application as dbp_reductions
+    """
+
+    counts = np.asarray(counts)
+    pretreatment = np.asarray(pretreatment, dtype=float)
+    keep = 1 - DBP_SLOPE  # share of the previous reduction kept after each dose
+
+    dbp_reduc = np.zeros(np.broadcast(counts[..., 0], pretreatment).shape)
+    for d in range(len(DBP_DRUG_ORDER)):
+        decay = keep**counts[..., d]
+        dbp_reduc = decay*dbp_reduc + (DBP_DRUG_DROP[d] + DBP_SLOPE*(pretreatment - DBP_REFERENCE))*(1 - decay)/DBP_SLOPE
+
+    return dbp_reduc
+
+# Calculating DBP reductions from 0 to numtrt standard generic doses at once (same operations as dbp_reductions_generic)
+def dbp_reductions_generic_table(pretreatment, numtrt=5):
+    """
+    Inputs:
+    pretreatment: pre-treatment DBP, array
+    numtrt: largest number of standard doses
+
+    Outputs:
+    table: DBP reductions of 0, 1, ..., numtrt standard doses, array pretreatment.shape + (numtrt+1,)
+        (NaN for more than 5 doses)
+    """
+
+    pretreatment = np.asarray(pretreatment, dtype=float)
+    table = np.full(pretreatment.shape + (numtrt+1,), np.nan)
+    table[..., 0] = 0  # no trt
+    reduction = np.zeros(pretreatment.shape)
+    for trt in range(1, min(numtrt, 5)+1):
+        reduction = reduction + DBPreduc(pretreatment - reduction)
+        table[..., trt] = reduction
+
+    return table
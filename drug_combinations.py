@@ -0,0 +1,173 @@
+# ==============================================================
+# Combinations of antihypertensive drugs as treatment options
+# ==============================================================
+
+# Loading modules
+from functools import lru_cache  # caching
+from itertools import combinations_with_replacement  # drug combinations
+import numpy as np
+from sbp_reductions_drugtype import sbp_reductions_array, SBP_DRUG_ORDER
+from dbp_reductions_drugtype import dbp_reductions_array, DBP_DRUG_ORDER
+
+# Drug classes considered
+DRUG_CLASSES = ["ACE", "ARB", "BB", "CCB", "TH"]
+
+# Generating treatment options as combinations of drug classes
+def drug_combinations(drugs=DRUG_CLASSES, max_meds=5, max_per_class=None):
+    """
+    Generate every combination of up to max_meds medications from the drug classes
+
+    Inputs:
+    drugs: drug classes
+    max_meds: maximum number of medications in a combination
+    max_per_class: maximum number of medications of the same class (default: no limit)
+
+    Outputs:
+    alldrugs: treatment options, starting with no treatment ("NT") followed by combinations
+        (tuples of drug classes) sorted by number of medications
+    """
+
+    alldrugs = ["NT"]  # no treatment
+    for numeds in range(1, max_meds+1):
+        for comb in combinations_with_replacement(drugs, numeds):
+            if max_per_class is None or max(comb.count(d) for d in drugs) <= max_per_class:
+                alldrugs.append(comb)
+
+    return alldrugs
+
+# Number of medications in each treatment option
+def meds_per_action(alldrugs):
+    return np.array([(0 if comb == "NT" else 1) if type(comb) == str else len(comb) for comb in alldrugs])
+
+# Grouping treatment options by number of medications
+def action_classes_by_meds(alldrugs, numeds):
+    """
+    Indexes of the treatment options with 0, 1, ..., numeds medications (e.g., action_class_meds)
+    """
+
+    meds = meds_per_action(alldrugs)
+
+    return [list(np.where(meds == m)[0]) for m in range(numeds+1)]
+
+# Hashable version of a list of treatment options
+def _treatment_key(alldrugs):
+    return tuple(comb if type(comb) == str else tuple(comb) for comb in alldrugs)
+
+# Drug classes are applied in the same order for SBP and DBP reductions
+assert SBP_DRUG_ORDER == DBP_DRUG_ORDER
+
+@lru_cache(maxsize=32)
+def _drug_counts(key):
+    # Number of standard doses of each drug class (in the order reductions are applied)
+    counts = np.array([[list(comb).count(d) if type(comb) != str else int(comb == d) for d in SBP_DRUG_ORDER]
+                       for comb in key])
+    counts[0] = 0  # the first option is no treatment
+    counts.setflags(write=False)
+
+    return counts
+
+# Calculating SBP and DBP reductions of every treatment option
+def bp_reductions(alldrugs, pretrtsbp, pretrtdbp):
+    """
+    SBP and DBP reductions of every treatment option, using a cached table of drug counts
+    per option and the closed-form reductions
+
+    Inputs:
+    alldrugs: treatment options (the first option is no treatment)
+    pretrtsbp, pretrtdbp: pre-treatment SBP and DBP (arrays of any shape)
+
+    Outputs:
+    sbpreduc, dbpreduc: BP reductions, arrays of shape pretrtsbp.shape + (A,)
+    """
+
+    counts = _drug_counts(_treatment_key(alldrugs))
+    sbpreduc = sbp_reductions_array(counts, np.asarray(pretrtsbp, dtype=float)[..., None])
+    dbpreduc = dbp_reductions_array(counts, np.asarray(pretrtdbp, dtype=float)[..., None])
+
+    return sbpreduc, dbpreduc
+
+# Selecting a treatment option for a given number of medications
+def meds_to_actions(policy, action_class_meds, feasible):
+    """
+    Map a policy in number of medications to treatment options: in each state, the first
+    feasible option with that number of medications (or the first option if none is feasible)
+
+    Inputs:
+    policy: number of medications per state (S,), or policies (... x S)
+    action_class_meds: indexes of the treatment options with 0, 1, ..., numeds medications
+    feasible: feasibility indicators (S x A), or (... x S x A) broadcastable to the policies
+
+    Outputs:
+    actions: treatment option per state (S,), or (... x S)
+    """
+
+    # First feasible option of each number of medications per state (... x S x numeds+1)
+    feasible = np.asarray(feasible)
+    options = np.empty(feasible.shape[:-1] + (len(action_class_meds),), dtype=int)
+    for m, meds_class in enumerate(action_class_meds):
+        meds_class = np.asarray(meds_class, dtype=int)
+        feasible_class = feasible[..., meds_class] == 1
+        options[..., m] = np.where(feasible_class.any(axis=-1), meds_class[np.argmax(feasible_class, axis=-1)],
+                                   meds_class[0])
+
+    policy = np.asarray(policy).astype(int)
+    options = np.broadcast_to(options, policy.shape + options.shape[-1:])
+
+    return np.take_along_axis(options, policy[..., None], axis=-1)[..., 0]
+
+# Feasible numbers of medications per state
+def feasible_meds_mask(feasible, action_class_meds, numeds):
+    """
+    Indicators of the numbers of medications with at least one feasible treatment option in each state
+    (an option with no number of medications counts as no treatment)
+
+    Inputs:
+    feasible: feasibility indicators (S x A), or (... x S x A)
+    action_class_meds: indexes of the treatment options with 0, 1, ..., numeds medications
+    numeds: maximum number of medications
+
+    Outputs:
+    mask: feasibility of 0, 1, ..., numeds medications (S x numeds+1), or (... x S x numeds+1)
+    """
+
+    # Number of medications of each treatment option (first class containing it)
+    feasible = np.asarray(feasible)
+    option_meds = np.zeros(feasible.shape[-1], dtype=int)
+    assigned = np.zeros(feasible.shape[-1], dtype=bool)
+    for m, meds_class in enumerate(action_class_meds):
+        first = np.zeros(feasible.shape[-1], dtype=bool); first[meds_class] = True
+        first &= ~assigned
+        option_meds[first] = m
+        assigned |= first
+
+    return np.stack([(feasible[..., option_meds == m] == 1).any(axis=-1) for m in range(numeds+1)], axis=-1)
+
+# Projecting policies in number of medications onto feasible numbers of medications
+def project_feasible_meds(policy, meds_mask):
+    """
+    Replace the number of medications of each state that has no feasible treatment option with one more
+    (or otherwise one fewer) medication, or the largest feasible number of medications if neither is feasible
+
+    Inputs:
+    policy: number of medications per state (S,), or policies (... x S)
+    meds_mask: output of feasible_meds_mask (S x numeds+1), or (... x S x numeds+1) broadcastable to the policies
+
+    Outputs:
+    policy: feasible number of medications per state, same shape as the input
+    repairs: number of states changed in each policy (scalar, or (...,))
+    """
+
+    policy = np.asarray(policy, dtype=float)
+    meds_mask = np.broadcast_to(meds_mask, policy.shape + meds_mask.shape[-1:])
+
+    def is_feasible(meds):
+        valid = (meds >= 0) & (meds < meds_mask.shape[-1]) & (meds == np.round(meds))  # NaN is never feasible
+        index = np.where(valid, meds, 0).astype(int)
+        return valid & np.take_along_axis(meds_mask, index[..., None], axis=-1)[..., 0]
+
+    largest = meds_mask.shape[-1] - 1 - np.argmax(meds_mask[..., ::-1], axis=-1)  # largest number of medications feasible
+    keep = is_feasible(policy)
+    projected = np.where(keep, policy, np.where(is_feasible(policy+1), policy+1,
+                                                np.where(is_feasible(policy-1), policy-1, largest)))
+
+    return projected, (~keep).sum(axis=-1)
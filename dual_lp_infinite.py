@@ -0,0 +1,85 @@
+# ================================
+# Dual (occupancy measure) linear program of infinite horizon MDPs
+# ================================
+
+# Loading modules
+import numpy as np  # array operations
+from policy_evaluation_infinite import policy_improvement_batch, policy_transitions  # batched solves
+
+# Occupancy measure of a deterministic policy
+def occupancy_infinite(pi, P, alpha, gamma):
+    """
+    Expected discounted number of visits to each state-action pair under a policy,
+    x(s, pi(s)) = [(I - gamma*P_pi^T)^-1 alpha](s) and 0 for every other action
+
+    Inputs:
+    pi: policies (S,) or (N x S)
+    P: transition probabilities (S x S x A) or (N x S x S x A)
+    alpha: initial state distribution (S,) or (N x S)
+    gamma: discount factor
+
+    Outputs:
+    x: occupancy measures (S x A) or (N x S x A)
+    """
+
+    # Working with batches
+    single = P.ndim == 3
+    if single:
+        pi, P = np.asarray(pi)[None], P[None]
+    N, S, A = P.shape[0], P.shape[1], P.shape[3]
+    pi = np.asarray(pi).astype(int)
+    alpha = np.broadcast_to(np.asarray(alpha, dtype=float), (N, S))
+
+    # Solving (I - gamma*P_pi^T)x_pi = alpha
+    P_pi = policy_transitions(P, pi)  # (N x S x S)
+    x_pi = np.linalg.solve(np.eye(S) - gamma*np.swapaxes(P_pi, 1, 2), alpha[..., None])[..., 0]
+
+    x = np.zeros((N, S, A))
+    np.put_along_axis(x, pi[..., None], x_pi[..., None], axis=2)
+
+    return x[0] if single else x
+
+# Simplex method for the dual linear program of infinite horizon MDPs
+def dual_lp_infinite(P, r, alpha, gamma, max_iterations=1000):
+    """
+    Solve the dual linear program of infinite horizon MDPs
+
+        max  sum_{s,a} r(s,a) x(s,a)
+        s.t. sum_a x(j,a) - gamma*sum_{s,a} P(j|s,a) x(s,a) = alpha(j)  for every state j
+             x >= 0
+
+    with the simplex method specialised to MDPs: every basis holds one action per state (a deterministic
+    policy), its basic solution is the policy's occupancy measure, its simplex multipliers are the policy's
+    value function, and the reduced cost of (s,a) is Q(s,a) - V(s). Every state with a positive reduced cost
+    enters the basis at once (block pivoting), for a batch of MDPs simultaneously.
+
+    Inputs:
+    P: transition probabilities (S x S x A) or (N x S x S x A)
+    r: rewards (S x A) or (N x S x A)
+    alpha: initial state distribution (S,) or (N x S)
+    gamma: discount factor
+    max_iterations: maximum number of pivots
+
+    Outputs:
+    x: optimal occupancy measures (S x A) or (N x S x A)
+    V: optimal values, i.e., optimal dual variables (S,) or (N x S)
+    obj: optimal objective values (scalar or (N,))
+    """
+
+    # Working with batches
+    single = P.ndim == 3
+    if single:
+        P, r = P[None], r[None]
+
+    # Pivoting until no reduced cost is positive
+    pi, V, converged = policy_improvement_batch(P, r, gamma, max_iterations)
+    if not converged.all():
+        raise RuntimeError("Simplex method did not converge in " + str(max_iterations) + " iterations")
+
+    # Basic solutions
+    x = occupancy_infinite(pi, P, alpha, gamma)
+    obj = np.einsum('nsa,nsa->n', x, r)
+
+    if single:
+        return x[0], V[0], obj[0]
+    return x, V, obj
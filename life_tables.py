@@ -0,0 +1,63 @@
+# =======================================================
+# Age-indexed lookup arrays for life expectancy, mortality, and risk slope data
+# =======================================================
+
+# Loading modules
+import numpy as np  # array operations
+
+class LifeTables:
+    """
+    Dense lookup arrays built once from the Data/*.csv tables (e.g., as loaded by cohort_runner_infinite.load_lookup_tables)
+
+    Life expectancy and death likelihoods are stored in arrays of shape (ages, 2) indexed by
+    (age - youngest age, sex column), where sex column 0 is male (sex=1) and 1 is female (sex=0),
+    matching columns 1 and 2 of the csv files. Risk slopes are stored in an array of shape (ages, 2)
+    indexed by (age - youngest age, event), where event 0 is CHD and 1 is stroke.
+    All lookups accept scalars or arrays of ages (and sexes).
+    """
+
+    def __init__(self, lifedata, chddeathdata, strokedeathdata, alldeathdata, riskslopedata):
+        ages = np.asarray(lifedata.iloc[:, 0], dtype=int)
+        self.min_age = ages[0]
+        self.max_age = ages[-1]
+        for data in (lifedata, chddeathdata, strokedeathdata, alldeathdata, riskslopedata):
+            if not np.array_equal(np.asarray(data.iloc[:, 0], dtype=int), np.arange(self.min_age, self.max_age+1)):
+                raise ValueError("Lookup tables must have one row per consecutive age, starting at the same age")
+
+        self.life = lifedata.iloc[:, 1:3].to_numpy(dtype=float)  # life expectancy
+        self.chd_death = chddeathdata.iloc[:, 1:3].to_numpy(dtype=float)  # likelihood of death given a CHD event
+        self.stroke_death = strokedeathdata.iloc[:, 1:3].to_numpy(dtype=float)  # likelihood of death given a stroke
+        self.all_death = alldeathdata.iloc[:, 1:3].to_numpy(dtype=float)  # likelihood of death from non-ASCVD causes
+        self.risk_slopes = riskslopedata.iloc[:, 1:3].to_numpy(dtype=float)  # relative risk of CHD and stroke
+
+    def age_index(self, age):
+        """Row of the lookup arrays for each age"""
+
+        age = np.asarray(age).astype(int)
+        if np.any(age < self.min_age) or np.any(age > self.max_age):
+            raise ValueError(f"Ages must be between {self.min_age} and {self.max_age}")
+
+        return age - self.min_age
+
+    @staticmethod
+    def sex_index(sex):
+        """Column of the lookup arrays for each sex (1=male, 0=female)"""
+
+        return np.where(np.asarray(sex) == 1, 0, 1)
+
+    def life_expectancy(self, age, sex):
+        return self.life[self.age_index(age), self.sex_index(sex)]
+
+    def chddeath(self, age, sex):
+        return self.chd_death[self.age_index(age), self.sex_index(sex)]
+
+    def strokedeath(self, age, sex):
+        return self.stroke_death[self.age_index(age), self.sex_index(sex)]
+
+    def alldeath(self, age, sex):
+        return self.all_death[self.age_index(age), self.sex_index(sex)]
+
+    def riskslopes(self, age):
+        """Risk slopes of CHD and stroke events, array (..., 2)"""
+
+        return self.risk_slopes[self.age_index(age)]
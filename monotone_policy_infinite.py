@@ -0,0 +1,115 @@
+# ================================
+# Optimal monotone policies for infinite horizon MDPs
+# ================================
+
+# Loading modules
+import numpy as np  # array operations
+from policy_evaluation_infinite import policy_improvement_masked  # restricted MDPs
+
+# Branch and bound search for the optimal monotone policy (without Gurobi)
+def monotone_policy_infinite(P, r, alpha, gamma, S_class, A_class, dead=(), feasible=None, tolerance=1e-10):
+    """
+    Optimal monotone policy for an infinite horizon MDP
+
+    A policy is monotone if, for state classes i < j (in the order of S_class), every action used in
+    class i belongs to an action class (in the order of A_class) no greater than the action classes of the
+    actions used in class j. Dead states are excluded from the ordering and always take action 0.
+
+    Monotonicity only depends on the action class used in each state, so the search assigns action classes
+    to states in order of their state class. The optimal value of the MDP in which each state may take any
+    action of its assigned class (or, if unassigned, of a class allowed by the assigned earlier states) bounds
+    the value of every monotone completion, so subtrees whose bound does not exceed the best monotone policy
+    found are pruned, and subtrees whose bounding policy is already monotone are solved.
+
+    Inputs:
+    P: transition probabilities (S x S x A)
+    r: rewards (S x A)
+    alpha: initial state distribution (S,)
+    gamma: discount factor
+    S_class: ordered classes of states (list of lists of states)
+    A_class: ordered classes of actions (list of lists of actions)
+    dead: dead states (action 0)
+    feasible: feasibility indicators (S x A), all actions are allowed if None
+    tolerance: minimum improvement in the objective to explore a subtree
+
+    Outputs:
+    d_mopt: optimal monotone policy (S,)
+    V_mopt: value function of the optimal monotone policy (S,)
+    J_mopt: objective value of the optimal monotone policy
+    """
+
+    # Extracting parameters
+    S = P.shape[0]  # number of states
+    A = P.shape[2]  # number of actions
+    alpha = np.asarray(alpha, dtype=float)
+
+    # Class of each state and action
+    sclass = np.full(S, -1)
+    for i, states in enumerate(S_class):
+        sclass[states] = i
+    aclass = np.full(A, -1)
+    for i, actions in enumerate(A_class):
+        aclass[actions] = i
+
+    # States ordered by class (alive states only)
+    order = [s for states in S_class for s in states if s not in dead]
+
+    # Allowed actions at the root
+    root = np.ones((S, A), dtype=bool) if feasible is None else (np.asarray(feasible) == 1)
+    root[list(dead), :] = False; root[list(dead), 0] = True
+    root[order, :] &= (aclass >= 0)[None, :]
+
+    def is_monotone(policy):
+        # largest action class in each state class must not exceed the smallest action class in later classes
+        largest = -1
+        for states in S_class:
+            states = [s for s in states if s not in dead]
+            if len(states) == 0:
+                continue
+            if aclass[policy[states]].min() < largest:
+                return False
+            largest = max(largest, aclass[policy[states]].max())
+        return True
+
+    def child_mask(mask, depth, c):
+        # assigning action class c to the state at the given depth and restricting the states of later classes
+        mask = mask.copy()
+        s = order[depth]
+        mask[s, aclass != c] = False
+        later = [t for t in order[depth+1:] if sclass[t] > sclass[s]]
+        mask[np.ix_(later, np.where(aclass < c)[0])] = False
+        return mask
+
+    # Bounding the root problem
+    pi_root, V_root = policy_improvement_masked(P, r, gamma, root[None])
+    best_J = -np.inf; best_pi = None; best_V = None
+    stack = [(root, 0, pi_root[0], V_root[0])]  # (allowed actions, depth, bounding policy, bounding values)
+
+    # Depth first search
+    while stack:
+        mask, depth, pi_bound, V_bound = stack.pop()
+        J_bound = np.dot(alpha, V_bound)
+        if J_bound <= best_J + tolerance:  # cannot improve on the incumbent
+            continue
+        if is_monotone(pi_bound):  # best policy in this subtree
+            best_J, best_pi, best_V = J_bound, pi_bound, V_bound
+            continue
+
+        # Branching on the action classes of the next state
+        classes = np.unique(aclass[mask[order[depth], :]])
+        masks = np.stack([child_mask(mask, depth, c) for c in classes])
+        masks = masks[masks.any(axis=2).all(axis=1)]  # every state needs an allowed action
+        if masks.shape[0] == 0:
+            continue
+        pi_children, V_children = policy_improvement_masked(P, r, gamma, masks)
+        J_children = V_children @ alpha
+
+        # Exploring the most promising children first
+        for k in np.argsort(J_children):
+            if J_children[k] > best_J + tolerance:
+                stack.append((masks[k], depth+1, pi_children[k], V_children[k]))
+
+    d_mopt = best_pi.copy()
+    d_mopt[list(dead)] = 0  # treating only on alive states
+
+    return d_mopt, best_V, best_J
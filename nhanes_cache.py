@@ -0,0 +1,109 @@
+# =======================================================
+# Memory-mapped binary cache of the NHANES forecasted dataset
+# =======================================================
+
+# Loading modules
+import os  # file paths
+import numpy as np  # array operations
+import pandas as pd  # data manipulation
+
+# Location of the forecasted dataset and its binary cache
+NHANES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Data', 'Continuous NHANES')
+NHANES_CSV = os.path.join(NHANES_DIR, 'Continuous NHANES Forecasted Dataset.csv')
+NHANES_CACHE_DIR = os.path.join(NHANES_DIR, 'forecasted_cache')
+
+# One-time conversion of the forecasted dataset into one .npy file per column
+def build_nhanes_cache(csv_path=NHANES_CSV, cache_dir=NHANES_CACHE_DIR):
+    """
+    Convert the NHANES forecasted dataset into a columnar binary cache
+
+    The rows are sorted by patient id and stored as one .npy file per column, together with
+    a dense index (position = patient id - smallest id) of each patient's first and last row
+
+    Inputs:
+    csv_path: path of the forecasted dataset
+    cache_dir: directory where the cache is written
+    """
+
+    ptdata = pd.read_csv(csv_path).sort_values('id', kind='stable')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    for col in ptdata.columns:
+        np.save(os.path.join(cache_dir, col + '.npy'), ptdata[col].to_numpy())
+
+    # Patient id index
+    ids, start, count = np.unique(ptdata.id.to_numpy(), return_index=True, return_counts=True)
+    offsets = np.full((ids.max() - ids.min() + 1, 2), -1, dtype=np.int64)  # first row and row after the last
+    offsets[ids - ids.min(), 0] = start
+    offsets[ids - ids.min(), 1] = start + count
+    np.save(os.path.join(cache_dir, 'index_offsets.npy'), offsets)
+    np.save(os.path.join(cache_dir, 'index_ids.npy'), ids)
+    with open(os.path.join(cache_dir, 'columns.txt'), 'w') as f:
+        f.write('\n'.join(ptdata.columns))
+
+class NHANESCache:
+    """
+    Read-only, memory-mapped view of the NHANES forecasted dataset cache
+
+    Any patient's rows are fetched in constant time through the patient id index,
+    without reading the rest of the dataset
+    """
+
+    def __init__(self, cache_dir=NHANES_CACHE_DIR):
+        with open(os.path.join(cache_dir, 'columns.txt')) as f:
+            self.column_names = f.read().split('\n')
+        self.columns = {col: np.load(os.path.join(cache_dir, col + '.npy'), mmap_mode='r')
+                        for col in self.column_names}
+        self.offsets = np.load(os.path.join(cache_dir, 'index_offsets.npy'))
+        self.ids = np.load(os.path.join(cache_dir, 'index_ids.npy'))
+        self.min_id = self.ids.min()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, pt_id):
+        """First row and row after the last of a patient"""
+
+        position = pt_id - self.min_id
+        if position < 0 or position >= self.offsets.shape[0] or self.offsets[position, 0] < 0:
+            raise KeyError(f"No patient data found for patient ID {pt_id}")
+
+        return self.offsets[position, 0], self.offsets[position, 1]
+
+    def patient(self, pt_id):
+        """Patient data (one row per year) as a DataFrame, as in ptdata[ptdata.id == pt_id]"""
+
+        start, stop = self.rows(pt_id)
+
+        return pd.DataFrame({col: np.array(self.columns[col][start:stop]) for col in self.column_names},
+                            index=np.arange(start, stop))
+
+    def first_rows(self, col):
+        """Value of a column in the first row of every patient (in the order of self.ids)"""
+
+        return np.array(self.columns[col][self.offsets[self.ids - self.min_id, 0]])
+
+    def reference_rows(self, pt_ids, row=0):
+        """Row number row (e.g., the reference age index) of each patient as a DataFrame, one row per patient"""
+
+        offsets = np.array([self.rows(pt_id) for pt_id in pt_ids], dtype=np.int64).reshape(-1, 2)
+        rows = offsets[:, 0] + row
+        if np.any(rows >= offsets[:, 1]):
+            raise KeyError(f"Patients have fewer than {row+1} rows")
+
+        return pd.DataFrame({col: np.array(self.columns[col][rows]) for col in self.column_names}, index=rows)
+
+# Opening the cache, building it first if it is missing or older than the dataset
+def load_nhanes_cache(csv_path=NHANES_CSV, cache_dir=NHANES_CACHE_DIR):
+    """
+    Open the memory-mapped cache of the NHANES forecasted dataset
+
+    Outputs:
+    cache: NHANESCache
+    """
+
+    index_path = os.path.join(cache_dir, 'index_offsets.npy')
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(csv_path):
+        build_nhanes_cache(csv_path, cache_dir)
+
+    return NHANESCache(cache_dir)
@@ -8,244 +8,313 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Loading modules
 import numpy as np  # array operations
-import pandas as pd  # data manipulation
 from termcolor import colored # colored warnings
-from ascvd_risk import arisk  # risk calculations
-from transition_probabilities_infinite import TP_infinite  # transition probability calculations
-from policy_evaluation_infinite import evaluate_pi_infinite, policy_improvement_infinite  # MDPs without Gurobi
-from aha_2017_guideline_infinite import aha_guideline_infinite
-from risk_based_policy_infinite import risk_policy_infinite
+from ascvd_risk import arisk_batch  # risk calculations
+from transition_probabilities_infinite import TP_infinite_batch, CompactTransitions  # transition probability calculations
+from policy_evaluation_infinite import PolicyEvaluationContext, policy_improvement_infinite  # MDPs without Gurobi
+from dual_lp_infinite import occupancy_infinite  # occupancy measures
+from monotone_policy_infinite import monotone_policy_infinite  # monotone policies without Gurobi
+from aha_2017_guideline_infinite import aha_guideline_batch
+from risk_based_policy_infinite import risk_policy_batch
+from life_tables import LifeTables  # age-indexed lookup arrays
+from drug_combinations import meds_to_actions, feasible_meds_mask, project_feasible_meds  # treatment options per number of medications
+from stage_timing import timed  # per-stage wall time
+
+# Risk estimates for a batch of patients (stage 1 of the patient simulation)
+def cohort_risks_infinite(refdata, numhealth, events, stroke_hist, ascvd_hist):
+    """
+    Calculating 1-year and 10-year ASCVD risks per health state for a batch of patients at their reference age
+
+    Inputs:
+    refdata: patient data at the reference age, one row per patient (DataFrame with the columns of the
+        NHANES forecasted dataset)
+    numhealth: number of health states
+    events: number of event types (CHD and stroke)
+    stroke_hist: health states with a history of stroke
+    ascvd_hist: odds multipliers of CHD and stroke risks per health state (S x E)
+
+    Outputs:
+    periodrisk1: 1-year risk after scaling (N x S x E), used for transition probabilities
+    periodrisk10: 10-year risk after scaling (N x S x E), used for AHA's guidelines
+    """
 
-# Patient simulation function for infinite horizon MDP (without Gurobi)
-def patient_sim_infinite_no_gurobi(pt_id, patientdata, numhealth, healthy, dead, events, stroke_hist, ascvd_hist, event_states,
-                        lifedata, mortality_rates, chddeathdata, strokedeathdata, alldeathdata, riskslopedata, 
-                        sbpmin, dbpmin, sbpmax, dbpmax, alldrugs, trtharm, QoL, QoLterm, alpha, gamma, 
-                        state_order, S_class, action_order, A_class, action_class_meds, targetrisk, targetdiff, 
-                        targetsbp, targetdbp, numeds, reference_age_index=0):
+    # 1-year and 10-year ASCVD risk calculations (same in every health state before scaling)
+    ptrisk = arisk_batch(np.arange(events), refdata.sex, refdata.race, refdata.age, refdata.sbp, refdata.smk,
+                         refdata.tc, refdata.hdl, refdata.diab, 0, [1, 10])  # (N x E x 2)
+
+    # Changing scaling factor based on age
+    ascvd_hist_sim = np.repeat(np.asarray(ascvd_hist, dtype=float)[None], len(refdata), axis=0)  # (N x S x E)
+    ascvd_hist_sim[np.ix_(np.asarray(refdata.age) >= 60, stroke_hist, [1])] = 2
+
+    # Scaling odds of risks
+    def scale(ascvdrisk):
+        ascvdrisk = np.broadcast_to(ascvdrisk[:, None, :], ascvd_hist_sim.shape)
+        periododds = ascvd_hist_sim*(ascvdrisk/(1-ascvdrisk))
+        return np.where(ascvd_hist_sim > 1, periododds/(1+periododds),
+                        np.where(ascvd_hist_sim == 0, 0, ascvdrisk))  # set risk to 0, or no scale
+
+    return scale(ptrisk[:, :, 0]), scale(ptrisk[:, :, 1])
+
+# Transition probabilities for a batch of patients (stage 2 of the patient simulation)
+def cohort_transitions_infinite(refdata, periodrisk1, lifetables, numhealth, sbpmin, dbpmin, sbpmax, dbpmax, alldrugs,
+                                compact=False, dtype=np.float64):
     """
-    This function generates risk estimates and transition probabilities
-    to determine treatment policies per patient for infinite horizon MDP
-    (Version without Gurobi - uses policy improvement instead)
+    Calculating transition probabilities and feasibility indicators for a batch of patients at their reference age
+
+    Inputs:
+    refdata: patient data at the reference age, one row per patient
+    periodrisk1: 1-year risk after scaling (N x S x E)
+    lifetables: LifeTables with the death likelihoods and risk slopes
+    numhealth: number of health states
+    sbpmin (sbpmax), dbpmin (dbpmax): minimum (maximum) SBP and DBP allowed
+    alldrugs: treatment options being considered
+    compact, dtype: storage of the transition probabilities (see TP_infinite_batch)
+
+    Outputs:
+    P: transition probabilities (N x S x S x A), or CompactTransitions if compact
+    feas: feasibility indicators (N x S x A)
+    pretrtsbp, pretrtdbp: pre-treatment SBP and DBP (N x S)
+    riskslope: risk slopes of CHD and stroke (N x E)
     """
+
+    # Assume that the patient has the same pre-treatment SBP/DBP no matter the health condition
+    pretrtsbp = np.ones((len(refdata), numhealth))*np.asarray(refdata.sbp, dtype=float)[:, None]
+    pretrtdbp = np.ones((len(refdata), numhealth))*np.asarray(refdata.dbp, dtype=float)[:, None]
+
+    # Death rates and risk slopes (for BP reductions)
+    age = np.asarray(refdata.age); sex = np.asarray(refdata.sex)
+    riskslope = lifetables.riskslopes(age)  # CHD and stroke
+
+    P, feas = TP_infinite_batch(periodrisk1, lifetables.chddeath(age, sex), lifetables.strokedeath(age, sex),
+                                lifetables.alldeath(age, sex), riskslope, pretrtsbp, pretrtdbp,
+                                sbpmin, dbpmin, sbpmax, dbpmax, alldrugs, compact, dtype)
+
+    return P, feas, pretrtsbp, pretrtdbp, riskslope
+
+# Feasible guideline policies for a batch of patients
+def feasible_guidelines_infinite(pi_aha, pi_risk, feas, action_class_meds, numeds):
+    """
+    Projecting AHA guideline and risk-based policies onto the numbers of medications with a feasible treatment
+    option in each state, and mapping them to treatment options
+
+    Inputs:
+    pi_aha, pi_risk: number of medications per state (S,), or per patient and state (N x S)
+    feas: feasibility indicators sorted according to the state and action orderings (S x A), or (N x S x A)
+    action_class_meds: indexes of the treatment options with 0, 1, ..., numeds medications
+    numeds: maximum number of medications
+
+    Outputs:
+    d_aha, d_risk: treatment option per state in the sorted action order (S,), or (N x S)
+    repairs_aha, repairs_risk: number of states whose number of medications was not feasible (scalar, or (N,))
+    """
+
+    meds_mask = feasible_meds_mask(feas, action_class_meds, numeds)  # feasible numbers of medications per state
+    policies, (repairs_aha, repairs_risk) = project_feasible_meds(np.stack((pi_aha, pi_risk)), meds_mask)
+    d_aha, d_risk = meds_to_actions(policies, action_class_meds, feas)
+
+    return d_aha, d_risk, repairs_aha, repairs_risk
+
+# Ordered MDP of one patient
+def patient_mdp_infinite(P, feas, age, numhealth, alldrugs, trtharm, QoL, state_order, action_order):
+    """
+    Sorting transition probabilities and feasibility indicators of one patient according to the state and
+    action orderings, and calculating the expected rewards (QoL weights at the reference age minus treatment
+    disutilities) in the same order
+
+    Outputs:
+    P: transition probabilities (S x S x A), sorted
+    feas: feasibility indicators (S x A), sorted
+    r: rewards (S x A), sorted
+    """
+
+    # Sorting transition probabilities and feasibility indicators according to state ordering
+    if isinstance(P, CompactTransitions):
+        if not np.array_equal(state_order, np.arange(numhealth)):
+            raise ValueError("Compact transition probabilities require the natural state ordering")
+    else:
+        P = P[state_order, :, :]; P = P[:, state_order, :]
+    feas = feas[state_order, :]
+
+    # Sorting transition probabilities and feasibility indicators according to action ordering
+    P = P.take_actions(action_order) if isinstance(P, CompactTransitions) else P[:, :, action_order]
+    feas = feas[:, action_order]
+
+    # Calculating expected rewards (time-independent)
+    r = np.empty((numhealth, len(alldrugs))); r[:] = np.nan  # stores rewards
     
-    try:
-        print(f"Processing patient {pt_id}...")
-        
-        # Assume that the patient has the same pre-treatment SBP/DBP no matter the health condition
-        # Using reference age for time-independent parameters
-        pretrtsbp = np.ones(numhealth) * np.array(patientdata.sbp.iloc[reference_age_index])
-        pretrtdbp = np.ones(numhealth) * np.array(patientdata.dbp.iloc[reference_age_index])
-
-        # Storing risk calculations (time-independent)
-        ascvdrisk1 = np.empty((numhealth, events))  # 1-y CHD and stroke risk
-        periodrisk1 = np.empty((numhealth, events))  # 1-y risk after scaling
-
-        ascvdrisk10 = np.empty((numhealth, events))  # 10-y CHD and stroke risk
-        periodrisk10 = np.empty((numhealth, events))  # 10-y risk after scaling
-
-        for h in range(numhealth):  # each state
-            # Using reference age for time-independent calculations
-            age = patientdata.age.iloc[reference_age_index]
-            
-            # Changing scaling factor based on age
-            if age >= 60:
-                ascvd_hist_sim = ascvd_hist.copy()
-                ascvd_hist_sim[stroke_hist, 1] = 2
-            else:
-                ascvd_hist_sim = ascvd_hist.copy()
-
-            for k in range(events):  # each event type
-                # 1-year ASCVD risk calculation (for transition probabilities)
-                ascvdrisk1[h, k] = arisk(k, patientdata.sex.iloc[reference_age_index], 
-                                       patientdata.race.iloc[reference_age_index], age,
-                                       patientdata.sbp.iloc[reference_age_index], 
-                                       patientdata.smk.iloc[reference_age_index], 
-                                       patientdata.tc.iloc[reference_age_index],
-                                       patientdata.hdl.iloc[reference_age_index], 
-                                       patientdata.diab.iloc[reference_age_index], 0, 1)
-
-                # 10-year ASCVD risk calculation (for AHA's guidelines)
-                ascvdrisk10[h, k] = arisk(k, patientdata.sex.iloc[reference_age_index], 
-                                        patientdata.race.iloc[reference_age_index], age,
-                                        patientdata.sbp.iloc[reference_age_index], 
-                                        patientdata.smk.iloc[reference_age_index], 
-                                        patientdata.tc.iloc[reference_age_index],
-                                        patientdata.hdl.iloc[reference_age_index], 
-                                        patientdata.diab.iloc[reference_age_index], 0, 10)
-
-                if ascvd_hist_sim[h, k] > 1:
-                    # Scaling odds of 1-year risks
-                    periododds = ascvdrisk1[h, k]/(1-ascvdrisk1[h, k])
-                    periododds = ascvd_hist_sim[h, k]*periododds
-                    periodrisk1[h, k] = periododds/(1+periododds)
-
-                    # Scaling odds of 10-year risks
-                    periododds = ascvdrisk10[h, k]/(1-ascvdrisk10[h, k])
-                    periododds = ascvd_hist_sim[h, k]*periododds
-                    periodrisk10[h, k] = periododds/(1+periododds)
-
-                elif ascvd_hist_sim[h, k] == 0:  # set risk to 0
-                    periodrisk1[h, k] = 0
-                    periodrisk10[h, k] = 0
-                else:  # no scale
-                    periodrisk1[h, k] = ascvdrisk1[h, k]
-                    periodrisk10[h, k] = ascvdrisk10[h, k]
-
-        # life expectancy and death likelihood data index
-        if patientdata.sex.iloc[reference_age_index] == 1:  # male
-            sexcol = 1  # column in deathdata corresponding to male
-        else:
-            sexcol = 2  # column in deathdata corresponding to female
-
-        # Death rates (time-independent, using reference age)
-        age = patientdata.age.iloc[reference_age_index]
-        chddeath = chddeathdata.iloc[np.where(chddeathdata.iloc[:, 0] == age)[0][0], sexcol]
-        strokedeath = strokedeathdata.iloc[np.where(strokedeathdata.iloc[:, 0] == age)[0][0], sexcol]
-        alldeath = alldeathdata.iloc[np.where(alldeathdata.iloc[:, 0] == age)[0][0], sexcol]
-
-        # Risk slopes (for BP reductions, time-independent)
-        riskslope = riskslopedata.iloc[np.where(riskslopedata.iloc[:, 0] == age)[0][0], 1:3]  # Keep as DataFrame
-
-        # Calculating transition probabilities (time-independent)
-        P, feas = TP_infinite(periodrisk1, chddeath, strokedeath, alldeath, riskslope, 
-                             pretrtsbp, pretrtdbp, sbpmin, dbpmin, sbpmax, dbpmax, alldrugs)
-
-        # Sorting transition probabilities and feasibility indicators according to state ordering
-        P = P[state_order, :, :]; P = P[:, state_order, :]; feas = feas[state_order, :]
-
-        # Sorting transition probabilities and feasibility indicators according to action ordering
-        P = P[:, :, action_order]; feas = feas[:, action_order]
-
-        # Extracting list of infeasible actions per state
-        infeasible = []  # stores index of infeasible actions
-        feasible = []  # stores index of feasible actions
-        for s in range(feas.shape[0]):
-            infeasible.append(list(np.where(feas[s, :] == 0)[0]))
-            feasible.append(list(np.where(feas[s, :] == 1)[0]))
-
-        # Calculating expected rewards (time-independent)
-        r = np.empty((numhealth, len(alldrugs))); r[:] = np.nan  # stores rewards
-        
-        # QoL weights by reference age
-        age = patientdata.age.iloc[reference_age_index]
-        qol = None
-        if 40 <= age <= 44:
-            qol = QoL.get("40-44")
-        elif 45 <= age <= 54:
-            qol = QoL.get("45-54")
-        elif 55 <= age <= 64:
-            qol = QoL.get("55-64")
-        elif 65 <= age <= 74:
-            qol = QoL.get("65-74")
-        elif 75 <= age <= 84:
-            qol = QoL.get("75-84")
-        qol = np.array(qol)[state_order]  # Ordering rewards
-
-        # Subtracting treatment disutility
-        harmsort = np.array(trtharm)[action_order] # sorting disutilities according to action order
-        for a in range(len(alldrugs)):
-            r[:, a] = [max(0, rw-harmsort[a]) for rw in qol]  # bounding rewards below by zero
-
-        # Initial state distribution (time-independent)
-        alpha = alpha[state_order]  # initial state distribution
-
-        # Determining optimal policies using policy improvement (no Gurobi needed)
+    # QoL weights by reference age
+    qol = None
+    if 40 <= age <= 44:
+        qol = QoL.get("40-44")
+    elif 45 <= age <= 54:
+        qol = QoL.get("45-54")
+    elif 55 <= age <= 64:
+        qol = QoL.get("55-64")
+    elif 65 <= age <= 74:
+        qol = QoL.get("65-74")
+    elif 75 <= age <= 84:
+        qol = QoL.get("75-84")
+    qol = np.array(qol)[state_order]  # Ordering rewards
+
+    # Subtracting treatment disutility
+    harmsort = np.array(trtharm)[action_order] # sorting disutilities according to action order
+    for a in range(len(alldrugs)):
+        r[:, a] = [max(0, rw-harmsort[a]) for rw in qol]  # bounding rewards below by zero
+
+    return P, feas, r
+
+# Policies of one patient (stage 3 of the patient simulation)
+def solve_patient_infinite(pt_id, P, feas, periodrisk10, pretrtsbp, pretrtdbp, riskslope, age, numhealth, healthy, dead,
+                           event_states, sbpmin, dbpmin, alldrugs, trtharm, QoL, alpha, gamma, state_order, S_class,
+                           action_order, A_class, action_class_meds, targetrisk, targetdiff, targetsbp, targetdbp, numeds,
+                           verbose=True, pi_init=None, eval_sweeps=None, rng=None, guidelines=None, timer=None):
+    """
+    Determining and evaluating the optimal, monotone, AHA guideline, and risk-based policies of one patient
+    from the outputs of cohort_risks_infinite and cohort_transitions_infinite (one patient's slice of each)
+
+    The feasible AHA guideline and risk-based policies can be passed as guidelines (this patient's slice of the
+    outputs of feasible_guidelines_infinite) if already computed for a batch of patients with aha_guideline_batch,
+    risk_policy_batch, and feasible_guidelines_infinite
+
+    The wall time of each stage is recorded in timer (a StageTimer) if provided
+
+    Outputs:
+    result tuple of patient_sim_infinite_no_gurobi
+    """
+
+    # Ordered transition probabilities, feasibility indicators, and rewards
+    with timed(timer, "mdp setup"):
+        P, feas, r = patient_mdp_infinite(P, feas, age, numhealth, alldrugs, trtharm, QoL, state_order, action_order)
+
+    # Initial state distribution (time-independent)
+    alpha = alpha[state_order]  # initial state distribution
+    event_states = np.array(event_states)[state_order]  # ordering event indicators
+
+    # Determining optimal policies using policy improvement (no Gurobi needed)
+    if verbose:
         print(f"Finding optimal policy for patient {pt_id}...")
-        pi_opt, V_opt = policy_improvement_infinite(P, r, gamma)
+    with timed(timer, "optimal policy"):
+        if pi_init is not None:
+            pi_init = np.argsort(action_order)[np.asarray(pi_init).astype(int)]  # sorting according to action order
+        pi_opt, V_opt = policy_improvement_infinite(P, r, gamma, eval_sweeps=eval_sweeps, pi0=pi_init, rng=rng)
         d_opt = pi_opt.astype(int)
         d_opt[dead] = 0  # treating only on alive states
-        
-        # Calculate objective value
-        J_opt = np.dot(alpha, V_opt)
+    
+        # Calculate occupancy measure
+        occup_opt = occupancy_infinite(d_opt, P, alpha, gamma)
 
-        # For monotone policy, we'll use a simple heuristic
-        # (In the full version with Gurobi, this would be solved as an MIP)
+    # Determining the optimal monotone policy using branch and bound (no Gurobi needed)
+    if verbose:
         print(f"Finding monotone policy for patient {pt_id}...")
-        d_mopt = d_opt.copy()  # Start with optimal policy
-        
-        # Simple monotonicity enforcement: ensure higher states get higher or equal actions
-        for h in range(1, numhealth):
-            if h not in dead:  # Don't modify dead states
-                if d_mopt[h] < d_mopt[h-1]:
-                    d_mopt[h] = d_mopt[h-1]  # Make it monotone
-        
-        # Evaluate monotone policy
-        V_mopt = evaluate_pi_infinite(d_mopt, P, r, gamma)
-        J_mopt = np.dot(alpha, V_mopt)
+    with timed(timer, "monotone policy"):
+        d_mopt, V_mopt, J_mopt = monotone_policy_infinite(P, r, alpha, gamma, S_class, A_class, dead)
 
+    if guidelines is None:
         # Determining policy based on the 2017 AHA's guidelines (time-independent)
-        print(f"Finding AHA guideline policy for patient {pt_id}...")
-        # For infinite horizon, we use the reference age for guideline calculations
-        # Use the infinite horizon version that expects (numhealth, events) format
-        riskslope_reshaped = pd.DataFrame(riskslope.values.reshape(1, 2))  # Add time dimension as DataFrame
-        
-        pi_aha = aha_guideline_infinite(periodrisk10, pretrtsbp, pretrtdbp, 
-                                       targetrisk, targetsbp, targetdbp, sbpmin, dbpmin,
-                                       riskslope_reshaped, numeds, healthy)
-
-        ## Making sure clinical guidelines are feasible
-        feas_meds_list = [np.unique(np.select([[y in action_class_meds[x] for y in fst] for x in range(len(action_class_meds))], 
-                                             np.arange(numeds+1))).tolist() for fst in feasible] # feasible number of medications
-        for h in range(numhealth):
-            if pi_aha[h] not in feas_meds_list[h]: # checking feasibility of policy
-                pi_aha[h] = np.where((pi_aha[h]+1) in feas_meds_list[h], (pi_aha[h]+1), (pi_aha[h]-1)).astype(int)
-                if pi_aha[h] not in feas_meds_list[h]: # if neither is feasible, returning the largest number of medications feasible
-                    print(colored("Warning: Feasibility conditions not met for clinical guidelines in patient " + str(pt_id), "blue"))
-                    pi_aha[h] = max(feas_meds_list[h])
-
-        # Evaluate AHA policy
-        d_aha = pi_aha.astype(int)
-        V_aha = evaluate_pi_infinite(d_aha, P, r, gamma)
-        J_aha = np.dot(alpha, V_aha)
-        e_aha = np.zeros(numhealth)  # Simplified - no event calculation
-
-        # Determining policy based on a risk threshold (time-independent)
-        print(f"Finding risk-based policy for patient {pt_id}...")
-        # Use the infinite horizon version that expects (numhealth, events) format
-        riskslope_reshaped = pd.DataFrame(riskslope.values.reshape(1, 2))  # Add time dimension as DataFrame
-        
-        pi_risk = risk_policy_infinite(periodrisk10, pretrtsbp, pretrtdbp, 
-                                      targetrisk, targetdiff, sbpmin, dbpmin, riskslope_reshaped, numeds)
-
-        ## Making sure risk-based policies are feasible
-        feas_meds_list = [np.unique(np.select([[y in action_class_meds[x] for y in fst] for x in range(len(action_class_meds))],
-                                             np.arange(numeds + 1))).tolist() for fst in feasible]  # feasible number of medications
-        for h in range(numhealth):
-            if pi_risk[h] not in feas_meds_list[h]:  # checking feasibility of policy
-                pi_risk[h] = np.where((pi_risk[h] + 1) in feas_meds_list[h], (pi_risk[h] + 1),
-                                    (pi_risk[h] - 1)).astype(int)
-                if pi_risk[h] not in feas_meds_list[h]:  # if neither is feasible, returning the largest number of medications feasible
-                    print(colored("Warning: Feasibility conditions not met for risk-based policy in patient " + str(pt_id), "blue"))
-                    pi_risk[h] = max(feas_meds_list[h])
-
-        # Evaluate risk-based policy
-        d_risk = pi_risk.astype(int)
-        V_risk = evaluate_pi_infinite(d_risk, P, r, gamma)
-        J_risk = np.dot(alpha, V_risk)
-        e_risk = np.zeros(numhealth)  # Simplified - no event calculation
-
-        # Evaluating no treatment policy
-        print(f"Evaluating no treatment policy for patient {pt_id}...")
+        if verbose:
+            print(f"Finding AHA guideline policy for patient {pt_id}...")
+        with timed(timer, "guideline policies"):
+            # For infinite horizon, we use the reference age for guideline calculations
+            pi_aha = aha_guideline_batch(periodrisk10[None], pretrtsbp[None], pretrtdbp[None],
+                                         targetrisk, targetsbp, targetdbp, sbpmin, dbpmin,
+                                         riskslope[None], numeds, healthy)[0]
+
+            # Determining policy based on a risk threshold (time-independent)
+            if verbose:
+                print(f"Finding risk-based policy for patient {pt_id}...")
+            pi_risk = risk_policy_batch(periodrisk10[None], pretrtsbp[None], pretrtdbp[None],
+                                        targetrisk, targetdiff, sbpmin, dbpmin, riskslope[None], numeds)[0]
+
+        ## Making sure clinical guidelines and risk-based policies are feasible (in terms of treatment options)
+        with timed(timer, "feasibility projection"):
+            guidelines = feasible_guidelines_infinite(pi_aha, pi_risk, feas, action_class_meds, numeds)
+    d_aha, d_risk, repairs_aha, repairs_risk = guidelines
+    if verbose and repairs_aha + repairs_risk > 0:
+        print(colored(f"Warning: Feasibility conditions not met for clinical guidelines in patient {pt_id} "
+                      f"({repairs_aha} AHA and {repairs_risk} risk-based states repaired)", "blue"))
+
+    # Evaluating every policy in terms of QALYs, events, and life-years (identical policies are evaluated once)
+    if verbose:
+        print(f"Evaluating policies for patient {pt_id}...")
+    with timed(timer, "evaluation"):
         d_notrt = np.zeros(numhealth, dtype=int)  # No treatment policy
-        V_notrt = evaluate_pi_infinite(d_notrt, P, r, gamma)
-        e_notrt = np.zeros(numhealth)  # Simplified - no event calculation
+        alive = np.isin(np.arange(numhealth), dead, invert=True).astype(float)  # one life-year per period alive
+        evaluation = PolicyEvaluationContext(P, gamma, {"qaly": r, "events": event_states, "lifeyears": alive})
+        values = evaluation.evaluate(np.stack((d_notrt, d_opt, d_mopt, d_aha, d_risk)))
+        V_notrt, V_opt, V_mopt, V_aha, V_risk = values["qaly"]
+        e_notrt, e_opt, e_mopt, e_aha, e_risk = values["events"]
+        ly_notrt, ly_opt, ly_mopt, ly_aha, ly_risk = values["lifeyears"]
+        J_opt, J_mopt, J_aha, J_risk = values["qaly"][1:] @ alpha
+
+    # Changing policies back to original order (to match alldrugs list)
+    if ~np.isnan(np.stack((d_opt, d_mopt, d_aha, d_risk))).any():
+        d_opt = np.array(action_order)[d_opt.astype(int)]
+        d_mopt = np.array(action_order)[d_mopt.astype(int)]
+        d_aha = np.array(action_order)[d_aha.astype(int)]
+        d_risk = np.array(action_order)[d_risk.astype(int)]
+        occup_opt = occup_opt[:, np.argsort(action_order)]  # columns in the order of alldrugs, as the policies
+
+    if verbose:
+        print(f"Patient {pt_id} Done (Infinite Horizon, No Gurobi)")
 
-        # Changing policies back to original order (to match alldrugs list)
-        if ~np.isnan(np.stack((d_opt, d_mopt, d_aha, d_risk))).any():
-            d_opt = np.array(action_order)[d_opt.astype(int)]
-            d_mopt = np.array(action_order)[d_mopt.astype(int)]
-            d_aha = np.array(action_order)[d_aha.astype(int)]
-            d_risk = np.array(action_order)[d_risk.astype(int)]
+    return (pt_id, V_notrt, e_notrt,
+            V_opt, d_opt, occup_opt, J_opt,
+            V_mopt, d_mopt, J_mopt,
+            V_aha, d_aha, J_aha, e_aha,
+            V_risk, d_risk, J_risk, e_risk,
+            e_opt, e_mopt,
+            ly_notrt, ly_opt, ly_mopt, ly_aha, ly_risk,
+            repairs_aha, repairs_risk
+            )
 
-        print(f"Patient {pt_id} Done (Infinite Horizon, No Gurobi)")
+# Patient simulation function for infinite horizon MDP (without Gurobi)
+def patient_sim_infinite_no_gurobi(pt_id, patientdata, numhealth, healthy, dead, events, stroke_hist, ascvd_hist, event_states,
+                        lifedata, mortality_rates, chddeathdata, strokedeathdata, alldeathdata, riskslopedata, 
+                        sbpmin, dbpmin, sbpmax, dbpmax, alldrugs, trtharm, QoL, QoLterm, alpha, gamma, 
+                        state_order, S_class, action_order, A_class, action_class_meds, targetrisk, targetdiff, 
+                        targetsbp, targetdbp, numeds, reference_age_index=0, verbose=True, lifetables=None,
+                        pi_init=None, eval_sweeps=None, rng=None, timer=None):
+    """
+    This function generates risk estimates and transition probabilities
+    to determine treatment policies per patient for infinite horizon MDP
+    (Version without Gurobi - uses policy improvement instead)
+    
+    Set verbose=False to silence per-patient progress messages (e.g., in cohort runs).
+    A LifeTables object built once from the lookup tables can be passed as lifetables
+    (otherwise it is built from lifedata, chddeathdata, strokedeathdata, alldeathdata and riskslopedata)
+    
+    The policy search can be warm started with pi_init, a policy in the order of alldrugs (e.g., the optimal
+    policy of a similar patient), and use modified policy iteration with eval_sweeps evaluation sweeps.
+    Without pi_init, the search starts from the greedy one-step policy, or from a random policy drawn with rng
+    (a NumPy random generator) if provided
+    
+    The wall time of each stage (risks, transitions, policies, and evaluations) is recorded in timer
+    (a StageTimer from stage_timing.py) if provided
+    """
+    
+    try:
+        if verbose:
+            print(f"Processing patient {pt_id}...")
+
+        # Life expectancy and death likelihood lookup arrays
+        if lifetables is None:
+            lifetables = LifeTables(lifedata, chddeathdata, strokedeathdata, alldeathdata, riskslopedata)
+
+        # Risk estimates and transition probabilities (time-independent, using reference age)
+        ref = patientdata.iloc[[reference_age_index]]
+        with timed(timer, "risks"):
+            periodrisk1, periodrisk10 = cohort_risks_infinite(ref, numhealth, events, stroke_hist, ascvd_hist)
+        with timed(timer, "transitions"):
+            P, feas, pretrtsbp, pretrtdbp, riskslope = cohort_transitions_infinite(ref, periodrisk1, lifetables, numhealth,
+                                                                                   sbpmin, dbpmin, sbpmax, dbpmax, alldrugs)
+
+        # Treatment policies
+        return solve_patient_infinite(pt_id, P[0], feas[0], periodrisk10[0], pretrtsbp[0], pretrtdbp[0], riskslope[0],
+                                      ref.age.iloc[0], numhealth, healthy, dead, event_states, sbpmin, dbpmin, alldrugs,
+                                      trtharm, QoL, alpha, gamma, state_order, S_class, action_order, A_class,
+                                      action_class_meds, targetrisk, targetdiff, targetsbp, targetdbp, numeds,
+                                      verbose=verbose, pi_init=pi_init, eval_sweeps=eval_sweeps, rng=rng, timer=timer)
 
-        return (pt_id, V_notrt, e_notrt,
-                V_opt, d_opt, None, J_opt,  # None for occupancy measure
-                V_mopt, d_mopt, J_mopt,
-                V_aha, d_aha, J_aha, e_aha,
-                V_risk, d_risk, J_risk, e_risk
-                )
-                
     except Exception as e:
         print(f"Error processing patient {pt_id}: {str(e)}")
         print(f"Error type: {type(e).__name__}")
@@ -4,38 +4,120 @@
 
 # Loading modules
 import numpy as np  # array operations
+from transition_probabilities_infinite import CompactTransitions  # structured-sparse transition probabilities
 
-# Infinite horizon policy evaluation function using value iteration
-def evaluate_pi_infinite(pi, P, r, gamma, max_iterations=1000, tolerance=1e-6):
+# Largest state space evaluated with an exact linear solve when method="auto"
+DIRECT_MAX_STATES = 1000
+
+# Bellman backup of every state-action pair
+def bellman_q(P, r, V, gamma):
+    """
+    Q-values Q(s,a) = r(s,a) + gamma*sum_t P(t|s,a)V(t), computed in a single call
+    
+    Inputs:
+    P: transition probabilities (S x S x A), or (N x S x S x A) for a batch of MDPs (dense or CompactTransitions)
+    r: rewards (S x A), or (N x S x A) for a batch of MDPs
+    V: value functions (S,) or (K x S) for one MDP, or (N x S) for a batch of MDPs
+    gamma: discount factor
+    
+    Outputs:
+    Q: Q-values (S x A), (K x S x A), or (N x S x A)
     """
-    Evaluate policy for infinite horizon MDP using value iteration
     
+    if isinstance(P, CompactTransitions):
+        PV = P.expectation(V)
+    elif P.ndim == 3:
+        PV = np.tensordot(V, P, axes=([-1], [1]))  # (... x S x A)
+    else:
+        PV = np.einsum('nsta,nt->nsa', P, V)
+    
+    return r + gamma*PV
+
+# Transition probabilities under deterministic policies
+def policy_transitions(P, pi):
+    """
     Inputs:
-    pi: policy matrix (S x A) - deterministic policy
+    P: transition probabilities (S x S x A), or (N x S x S x A) for a batch of MDPs (dense or CompactTransitions)
+    pi: policies (S,) or (K x S) for one MDP, or (N x S) for a batch of MDPs
+    
+    Outputs:
+    P_pi: transition probabilities under the policies (S x S), (K x S x S), or (N x S x S)
+    """
+    
+    if isinstance(P, CompactTransitions):
+        return P.policy_transitions(pi)
+    
+    pi = np.asarray(pi).astype(int)
+    states = np.arange(pi.shape[-1])
+    if P.ndim == 3:
+        return P[states, :, pi]
+    
+    return P[np.arange(P.shape[0])[:, None], states, :, pi]
+
+# Rewards under deterministic policies
+def policy_rewards(r, pi):
+    """
+    Inputs:
+    r: rewards (S x A), or (N x S x A) for a batch of MDPs
+    pi: policies (S,) or (K x S) for one MDP, or (N x S) for a batch of MDPs
+    
+    Outputs:
+    r_pi: rewards under the policies (S,), (K x S), or (N x S)
+    """
+    
+    pi = np.asarray(pi).astype(int)
+    
+    return np.take_along_axis(np.broadcast_to(r, pi.shape + r.shape[-1:]), pi[..., None], axis=-1)[..., 0]
+
+# Infinite horizon policy evaluation function using value iteration or an exact linear solve
+def evaluate_pi_infinite(pi, P, r, gamma, max_iterations=1000, tolerance=1e-6, method="auto"):
+    """
+    Evaluate policy for infinite horizon MDP using value iteration or by solving
+    the linear system (I - gamma*P_pi)V = r_pi
+    
+    A stack of policies (K x S) is evaluated in one call, building a (K x S x S) batch
+    of transition probability matrices that is solved (or iterated) together
+    
+    Inputs:
+    pi: policy (S,) or stack of policies (K x S) - deterministic policies
     P: transition probabilities (S x S x A)
     r: rewards (S x A)
     gamma: discount factor
-    max_iterations: maximum number of iterations
-    tolerance: convergence tolerance
+    max_iterations: maximum number of iterations (iterative method only)
+    tolerance: convergence tolerance (iterative method only)
+    method: "iterative" (value iteration), "direct" (exact linear solve),
+            or "auto" (direct for state spaces up to DIRECT_MAX_STATES)
     
     Outputs:
-    V_pi: value function (S,)
+    V_pi: value function (S,), or value functions (K x S) for a stack of policies
     """
     
     # Extracting parameters
     S = P.shape[0]  # number of states
     A = P.shape[2]  # number of actions
     
+    if method == "auto":
+        method = "direct" if S <= DIRECT_MAX_STATES else "iterative"
+    
+    # Transition probabilities and rewards under the policy
+    P_pi = policy_transitions(P, pi)
+    r_pi = policy_rewards(r, pi)
+    
+    if method == "direct":
+        # Solving (I - gamma*P_pi)V = r_pi
+        V_pi = np.linalg.solve(np.eye(S) - gamma*P_pi, r_pi[..., None])[..., 0]
+        
+        return V_pi
+    elif method != "iterative":
+        raise ValueError(f"Unknown policy evaluation method: {method}")
+    
     # Initialize value function
-    V_pi = np.zeros(S)
+    V_pi = np.zeros(r_pi.shape)
     
     # Value iteration
     for iteration in range(max_iterations):
-        V_pi_old = V_pi.copy()
-        
-        for s in range(S):
-            a = int(pi[s])  # action taken in state s
-            V_pi[s] = r[s, a] + gamma * np.dot(P[s, :, a], V_pi_old)
+        V_pi_old = V_pi
+        V_pi = r_pi + gamma*(P_pi @ V_pi_old[..., None])[..., 0]
         
         # Check for convergence
         if np.max(np.abs(V_pi - V_pi_old)) < tolerance:
@@ -49,7 +131,7 @@ def evaluate_events_infinite(pi, P, event_states, gamma, max_iterations=1000, to
     Evaluate expected number of events for infinite horizon MDP
     
     Inputs:
-    pi: policy matrix (S x A) - deterministic policy
+    pi: policy (S,) or stack of policies (K x S) - deterministic policies
     P: transition probabilities (S x S x A)
     event_states: event indicators (S,)
     gamma: discount factor
@@ -57,23 +139,24 @@ def evaluate_events_infinite(pi, P, event_states, gamma, max_iterations=1000, to
     tolerance: convergence tolerance
     
     Outputs:
-    E_pi: expected number of events (S,)
+    E_pi: expected number of events (S,), or (K x S) for a stack of policies
     """
     
     # Extracting parameters
     S = P.shape[0]  # number of states
     A = P.shape[2]  # number of actions
     
+    # Transition probabilities under the policy
+    P_pi = policy_transitions(P, pi)
+    event_states = np.asarray(event_states, dtype=float)
+    
     # Initialize expected events
-    E_pi = np.zeros(S)
+    E_pi = np.zeros(P_pi.shape[:-1])
     
     # Value iteration for events
     for iteration in range(max_iterations):
-        E_pi_old = E_pi.copy()
-        
-        for s in range(S):
-            a = int(pi[s])  # action taken in state s
-            E_pi[s] = event_states[s] + gamma * np.dot(P[s, :, a], E_pi_old)
+        E_pi_old = E_pi
+        E_pi = event_states + gamma*(P_pi @ E_pi_old[..., None])[..., 0]
         
         # Check for convergence
         if np.max(np.abs(E_pi - E_pi_old)) < tolerance:
@@ -81,17 +164,90 @@ def evaluate_events_infinite(pi, P, event_states, gamma, max_iterations=1000, to
     
     return E_pi
 
+# Evaluation of several policies of one MDP in terms of several rewards
+class PolicyEvaluationContext:
+    """
+    Exact evaluation of deterministic policies of one infinite horizon MDP for several right-hand sides
+    (e.g., QALY rewards, event indicators, and life-years) sharing the same transition probabilities
+
+    (I - gamma*P_pi) is factorised once per unique policy to solve every right-hand side at once, and the
+    solutions are cached, so identical policies (e.g., AHA and risk-based policies that
+    coincide) are only factorised once. Right-hand sides are either rewards per state and action (S x A)
+    or per state (S,), indexed by name.
+
+    Example:
+    evaluation = PolicyEvaluationContext(P, gamma, {"qaly": r, "events": event_states})
+    values = evaluation.evaluate(np.stack((d_opt, d_aha)))  # values["qaly"] has shape (2 x S)
+    """
+
+    def __init__(self, P, gamma, rhs):
+        self.P = P
+        self.gamma = gamma
+        self.S = P.shape[0]  # number of states
+        self.A = P.shape[2]  # number of actions
+        self.names = list(rhs)
+        self.rhs = np.stack([np.broadcast_to(np.asarray(rhs[name], dtype=float).reshape(self.S, -1), (self.S, self.A))
+                             for name in self.names], axis=2)  # (S x A x right-hand sides)
+        self.solutions = {}  # solutions of every right-hand side per policy (S x right-hand sides)
+
+    def __len__(self):
+        return len(self.solutions)  # number of factorisations
+
+    def _factorise(self, policies):
+        # Solving every right-hand side of a stack of new policies at once
+        P_pi = policy_transitions(self.P, policies)  # (K x S x S)
+        rhs_pi = self.rhs[np.arange(self.S)[None, :], policies]  # (K x S x right-hand sides)
+        solutions = np.linalg.solve(np.eye(self.S) - self.gamma*P_pi, rhs_pi)
+        for pi, solution in zip(policies, solutions):
+            self.solutions[pi.tobytes()] = solution
+
+    def evaluate(self, policies):
+        """
+        Inputs:
+        policies: policy (S,) or stack of policies (K x S)
+
+        Outputs:
+        values: dictionary of evaluations per right-hand side name, each of shape (S,) or (K x S)
+        """
+
+        policies = np.asarray(policies).astype(np.int64)
+        single = policies.ndim == 1
+        policies = policies.reshape(-1, self.S)
+
+        # Factorising the policies not seen before (once per unique policy)
+        new = np.unique(policies, axis=0)
+        new = new[[pi.tobytes() not in self.solutions for pi in new]]
+        if new.shape[0] > 0:
+            self._factorise(new)
+
+        solutions = np.stack([self.solutions[pi.tobytes()] for pi in policies])  # (K x S x right-hand sides)
+        values = {name: solutions[..., i] for i, name in enumerate(self.names)}
+
+        return {name: value[0] for name, value in values.items()} if single else values
+
 # Policy improvement for infinite horizon MDP
-def policy_improvement_infinite(P, r, gamma, max_iterations=1000, tolerance=1e-6):
+def policy_improvement_infinite(P, r, gamma, max_iterations=1000, tolerance=1e-6, eval_sweeps=None, pi0=None, V0=None,
+                                rng=None):
     """
     Policy improvement algorithm for infinite horizon MDP
     
+    With eval_sweeps=None, every policy is fully evaluated (policy iteration). Otherwise, every policy
+    is evaluated with eval_sweeps Bellman updates starting from the previous value function (modified
+    policy iteration), stopping once the policy is unchanged and the Bellman residual is below tolerance.
+    The search can be warm started from a policy (pi0) and/or value function (V0), e.g., the optimal
+    policy and value function of a similar patient.
+    
     Inputs:
     P: transition probabilities (S x S x A)
     r: rewards (S x A)
     gamma: discount factor
     max_iterations: maximum number of iterations
     tolerance: convergence tolerance
+    eval_sweeps: number of partial evaluation sweeps per improvement (default: full evaluation)
+    pi0: initial policy (S,) (default: greedy with respect to V0 if provided, random if rng is provided,
+         and the greedy one-step policy, i.e., largest immediate reward, otherwise)
+    V0: initial value function (S,) (default: zeros in modified policy iteration)
+    rng: NumPy random generator used to draw a random initial policy
     
     Outputs:
     pi_opt: optimal policy (S,)
@@ -102,25 +258,160 @@ def policy_improvement_infinite(P, r, gamma, max_iterations=1000, tolerance=1e-6
     S = P.shape[0]  # number of states
     A = P.shape[2]  # number of actions
     
-    # Initialize random policy
-    pi_opt = np.random.randint(0, A, S)
+    # Initialize policy
+    if pi0 is not None:
+        pi_opt = np.array(pi0).astype(int)
+    elif V0 is not None:
+        pi_opt = np.argmax(bellman_q(P, r, V0, gamma), axis=1)
+    elif rng is not None:
+        pi_opt = rng.integers(0, A, S)
+    else:
+        pi_opt = np.argmax(r, axis=1)
+    
+    if eval_sweeps is not None:
+        # Modified policy iteration
+        V_opt = np.zeros(S) if V0 is None else np.array(V0, dtype=float)
+        for iteration in range(max_iterations):
+            # Partial policy evaluation
+            P_pi = policy_transitions(P, pi_opt)
+            r_pi = policy_rewards(r, pi_opt)
+            for sweep in range(eval_sweeps):
+                V_opt = r_pi + gamma*P_pi @ V_opt
+            
+            # Policy improvement
+            Q_values = bellman_q(P, r, V_opt, gamma)
+            pi_old = pi_opt
+            pi_opt = np.argmax(Q_values, axis=1)
+            
+            # Check for convergence
+            if np.array_equal(pi_opt, pi_old) and np.max(np.abs(Q_values.max(axis=1) - V_opt)) < tolerance:
+                break
+        
+        # Value function of the final policy
+        V_opt = evaluate_pi_infinite(pi_opt, P, r, gamma, max_iterations, tolerance)
+        
+        return pi_opt, V_opt
     
     # Policy iteration
     for iteration in range(max_iterations):
-        pi_old = pi_opt.copy()
+        pi_old = pi_opt
         
         # Policy evaluation
         V_opt = evaluate_pi_infinite(pi_opt, P, r, gamma, max_iterations, tolerance)
         
         # Policy improvement
-        for s in range(S):
-            Q_values = np.zeros(A)
-            for a in range(A):
-                Q_values[a] = r[s, a] + gamma * np.dot(P[s, :, a], V_opt)
-            pi_opt[s] = np.argmax(Q_values)
+        pi_opt = np.argmax(bellman_q(P, r, V_opt, gamma), axis=1)
         
         # Check for convergence
         if np.array_equal(pi_opt, pi_old):
             break
     
     return pi_opt, V_opt
+
+# Batched policy iteration for a cohort of infinite horizon MDPs
+def policy_improvement_batch(P, r, gamma, max_iterations=1000, pi0=None, rng=None):
+    """
+    Policy iteration for a batch of infinite horizon MDPs solved simultaneously
+    (e.g., one MDP per patient in a cohort)
+
+    Inputs:
+    P: transition probabilities (N x S x S x A)
+    r: rewards (N x S x A)
+    gamma: discount factor
+    max_iterations: maximum number of iterations
+    pi0: initial policies (N x S) (default: random if rng is provided, greedy one-step policies otherwise)
+    rng: NumPy random generator used to draw random initial policies
+
+    Outputs:
+    pi_opt: optimal policies (N x S)
+    V_opt: optimal value functions (N x S)
+    converged: indicators of convergence per MDP (N,)
+    """
+
+    # Extracting parameters
+    N = P.shape[0]  # number of MDPs
+    S = P.shape[1]  # number of states
+    A = P.shape[3]  # number of actions
+
+    # Initialize policies
+    if pi0 is not None:
+        pi_opt = np.array(np.broadcast_to(pi0, (N, S))).astype(int)
+    elif rng is not None:
+        pi_opt = rng.integers(0, A, (N, S))
+    else:
+        pi_opt = np.argmax(r, axis=2)
+    V_opt = np.zeros((N, S))
+    active = np.ones(N, dtype=bool)  # MDPs whose policy has not converged yet
+
+    # Policy iteration
+    for iteration in range(max_iterations):
+        act = np.where(active)[0]
+        if act.size == 0:
+            break
+
+        # Policy evaluation (exact, one batched linear solve)
+        P_pi = policy_transitions(P[act], pi_opt[act])  # (n x S x S)
+        r_pi = policy_rewards(r[act], pi_opt[act])  # (n x S)
+        V_opt[act] = np.linalg.solve(np.eye(S) - gamma*P_pi, r_pi[..., None])[..., 0]
+
+        # Policy improvement
+        Q_values = bellman_q(P[act], r[act], V_opt[act], gamma)
+        pi_new = np.argmax(Q_values, axis=2)
+
+        # Check for convergence
+        unchanged = (pi_new == pi_opt[act]).all(axis=1)
+        pi_opt[act] = pi_new
+        active[act[unchanged]] = False
+
+    converged = ~active
+
+    return pi_opt, V_opt, converged
+
+# Policy iteration for one infinite horizon MDP under several sets of allowed actions
+def policy_improvement_masked(P, r, gamma, masks, max_iterations=1000, tolerance=1e-12):
+    """
+    Policy iteration for an infinite horizon MDP restricted to the allowed actions of each mask,
+    solving all restricted MDPs simultaneously (e.g., subproblems of a branch and bound search)
+    
+    Inputs:
+    P: transition probabilities (S x S x A)
+    r: rewards (S x A)
+    gamma: discount factor
+    masks: allowed actions per restricted MDP (K x S x A), at least one per state
+    max_iterations: maximum number of iterations
+    tolerance: minimum improvement in Q-values to change the action of a state
+    
+    Outputs:
+    pi_opt: optimal policies of the restricted MDPs (K x S)
+    V_opt: optimal value functions of the restricted MDPs (K x S)
+    """
+    
+    # Extracting parameters
+    K = masks.shape[0]  # number of restricted MDPs
+    S = P.shape[0]  # number of states
+    
+    # Initialize with the allowed action of largest immediate reward
+    pi_opt = np.argmax(np.where(masks, r[None], -np.inf), axis=2)
+    V_opt = np.zeros((K, S))
+    active = np.ones(K, dtype=bool)  # restricted MDPs whose policy has not converged yet
+    
+    # Policy iteration
+    for iteration in range(max_iterations):
+        act = np.where(active)[0]
+        if act.size == 0:
+            break
+        
+        # Policy evaluation (stack of policies)
+        V_opt[act] = evaluate_pi_infinite(pi_opt[act], P, r, gamma, method="direct")
+        
+        # Policy improvement (only switching actions on strict improvements, so ties cannot cycle)
+        Q_values = np.where(masks[act], bellman_q(P, r, V_opt[act], gamma), -np.inf)
+        best = np.argmax(Q_values, axis=2)
+        current = np.take_along_axis(Q_values, pi_opt[act][..., None], axis=2)[..., 0]
+        improved = np.max(Q_values, axis=2) > current + tolerance
+        pi_opt[act] = np.where(improved, best, pi_opt[act])
+        
+        # Check for convergence
+        active[act[~improved.any(axis=1)]] = False
+    
+    return pi_opt, V_opt
@@ -2,12 +2,33 @@
 # Calculating relative risk reductions based on risk slopes
 # =========================================================
 
+import numpy as np
+
 def new_risk(sbpreduc, riskslope, pretrtrisk, event):
 
     # post trt risk for each event type
     # event (0=CHD, 1=stroke)
 
-    RR = (list(riskslope)[event])**(sbpreduc/20)
-    risk = RR*pretrtrisk
+    return post_treatment_risk(sbpreduc, riskslope, pretrtrisk, event)
+
+# Post-treatment risks for arrays of SBP reductions, risks, and events
+def post_treatment_risk(sbpreduc, riskslope, pretrtrisk, event=None):
+    """
+    Post-treatment risk: pre-treatment risk scaled by a relative risk of riskslope**(sbpreduc/20)
+
+    Inputs:
+    sbpreduc: SBP reductions (broadcastable to pretrtrisk)
+    riskslope: risk slopes of CHD and stroke (E,) (e.g., a row of the risk slope table), or (... x E)
+    pretrtrisk: pre-treatment risks
+    event: event indexes (0=CHD, 1=stroke) selecting the slope of each risk, or None if the last axis of
+        riskslope already lines up with the risks
+
+    Outputs:
+    risk: post-treatment risks (broadcast shape of the inputs)
+    """
+
+    riskslope = np.asarray(riskslope, dtype=float)  # positional, whatever the labels of a Series
+    if event is not None:
+        riskslope = np.take(riskslope, event, axis=-1)
 
-    return risk
+    return riskslope**(np.asarray(sbpreduc)/20)*pretrtrisk
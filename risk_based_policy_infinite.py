@@ -4,9 +4,9 @@
 
 # Loading modules
 import numpy as np
-from post_treatment_risk import new_risk
-from sbp_reductions_drugtype import sbp_reductions_generic
-from dbp_reductions_drugtype import dbp_reductions_generic
+from post_treatment_risk import new_risk, post_treatment_risk
+from sbp_reductions_drugtype import sbp_reductions_generic, sbp_reductions_generic_table, take_reductions
+from dbp_reductions_drugtype import dbp_reductions_generic, dbp_reductions_generic_table
 
 # Function to obtain policy according to risk-based guidelines (Infinite Horizon Version)
 def risk_policy_infinite(pretrtrisk, pretrtsbp, pretrtdbp, targetrisk, targetdiff, sbpmin, dbpmin, riskslope, numtrt):
@@ -63,3 +63,49 @@ def risk_policy_infinite(pretrtrisk, pretrtsbp, pretrtdbp, targetrisk, targetdif
             policy[h] = past_trt # keep current treatment
     
     return policy
+
+# Function to obtain risk-based policies for a batch of patients and risk thresholds (Infinite Horizon Version)
+def risk_policy_batch(pretrtrisk, pretrtsbp, pretrtdbp, targetrisk, targetdiff, sbpmin, dbpmin, riskslope, numtrt):
+    """
+    Same titration rules as risk_policy_infinite, applied to every patient, health state, and risk threshold at once
+
+    The risk evaluated every month is the risk without treatment, so the number of medications reached after
+    12 monthly evaluations does not depend on the threshold: it is computed once per patient and state, and
+    each threshold only determines which states are treated
+
+    Inputs:
+    pretrtrisk: 10-year risk of CHD and stroke (N x S x E)
+    pretrtsbp, pretrtdbp: pre-treatment SBP and DBP (N x S)
+    targetrisk: risk threshold, or thresholds (T,) (e.g., np.arange(0.05, 0.2001, 0.005))
+    targetdiff: states with risk of at least targetrisk-targetdiff are treated
+    sbpmin, dbpmin: minimum SBP and DBP allowed
+    riskslope: risk slopes of CHD and stroke (N x E)
+    numtrt: maximum number of medications
+
+    Outputs:
+    policy: number of medications per patient and health state (N x S), or (T x N x S) for an array of thresholds
+    """
+
+    # Post-treatment BP of every number of medications (N x S x max(numtrt, 5)+1)
+    pretrtsbp = np.asarray(pretrtsbp, dtype=float); pretrtdbp = np.asarray(pretrtdbp, dtype=float)
+    sbptable = sbp_reductions_generic_table(pretrtsbp, max(numtrt, 5))
+    dbptable = dbp_reductions_generic_table(pretrtdbp, max(numtrt, 5))
+
+    # Post-treatment risk without treatment
+    post_trt_risk = post_treatment_risk(sbptable[..., :1], np.asarray(riskslope)[:, None, :], pretrtrisk).sum(axis=2)
+
+    # Simulating 1-month evaluations within each year (for states above the risk threshold)
+    past_trt = np.zeros(pretrtsbp.shape)
+    for month in range(12):
+        # Attempting to increase treatment
+        new_trt = np.where(past_trt + 1 > numtrt, past_trt, past_trt + 1)
+
+        # Evaluating the feasibility of new treatment
+        sbpreduc = take_reductions(sbptable, new_trt); dbpreduc = take_reductions(dbptable, new_trt)
+        infeasible = (pretrtsbp - sbpreduc < sbpmin) | (sbpreduc < 0) | (pretrtdbp - dbpreduc < dbpmin) | (dbpreduc < 0)
+        past_trt = np.where(infeasible, past_trt, new_trt)
+
+    # Treating states with moderate risk for ASCVD (ASCVD risk already on target keeping past year's treatment)
+    thresholds = np.asarray(targetrisk, dtype=float) - targetdiff
+
+    return np.where(post_trt_risk >= thresholds[..., None, None], past_trt, 0.0)
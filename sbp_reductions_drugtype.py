@@ -103,3 +103,74 @@ def sbp_reductions_generic(trt, pretreatment):
         reduction = np.nan
 
     return reduction
+
+# Standard-dose SBP drop of each drug class at a pre-treatment SBP of SBP_REFERENCE,
+# in the order drug classes are applied in sbp_reductions
+SBP_DRUG_ORDER = ['TH', 'BB', 'ACE', 'ARB', 'CCB']
+SBP_DRUG_DROP = np.array([8.8, 9.2, 8.5, 10.3, 8.8])
+SBP_REFERENCE = 154
+SBP_SLOPE = 0.1  # additional drop per mmHg of SBP
+
+# Calculating SBP reductions for arrays of drug counts (closed form of sbp_reductions)
+def sbp_reductions_array(counts, pretreatment):
+    """
+    Each standard dose reduces SBP by drop + SBP_SLOPE*(current SBP - SBP_REFERENCE), so n doses of
+    the same class applied to a reduction r give (1-SBP_SLOPE)**n*r plus a geometric series
+
+    Inputs:
+    counts: number of standard doses of each drug class in SBP_DRUG_ORDER, array (..., 5)
+    pretreatment: pre-treatment SBP, array broadcastable to counts[..., 0]
+
+    Outputs:
+    sbp_reduc: SBP reductions, same order of application as sbp_reductions
+    """
+
+    counts = np.asarray(counts)
+    pretreatment = np.asarray(pretreatment, dtype=float)
+    keep = 1 - SBP_SLOPE  # share of the previous reduction kept after each dose
+
+    sbp_reduc = np.zeros(np.broadcast(counts[..., 0], pretreatment).shape)
+    for d in range(len(SBP_DRUG_ORDER)):
+        decay = keep**counts[..., d]
+        sbp_reduc = decay*sbp_reduc + (SBP_DRUG_DROP[d] + SBP_SLOPE*(pretreatment - SBP_REFERENCE))*(1 - decay)/SBP_SLOPE
+
+    return sbp_reduc
+
+# Calculating SBP reductions from 0 to numtrt standard generic doses at once (same operations as sbp_reductions_generic)
+def sbp_reductions_generic_table(pretreatment, numtrt=5):
+    """
+    Inputs:
+    pretreatment: pre-treatment SBP, array
+    numtrt: largest number of standard doses
+
+    Outputs:
+    table: SBP reductions of 0, 1, ..., numtrt standard doses, array pretreatment.shape + (numtrt+1,)
+        (NaN for more than 5 doses)
+    """
+
+    pretreatment = np.asarray(pretreatment, dtype=float)
+    table = np.full(pretreatment.shape + (numtrt+1,), np.nan)
+    table[..., 0] = 0  # no trt
+    reduction = np.zeros(pretreatment.shape)
+    for trt in range(1, min(numtrt, 5)+1):
+        reduction = reduction + SBPreduc(pretreatment - reduction)
+        table[..., trt] = reduction
+
+    return table
+
+# Selecting reductions of a number of standard doses from a table of reductions
+def take_reductions(table, trt):
+    """
+    Inputs:
+    table: SBP or DBP reductions of 0, 1, ..., numtrt standard doses, array (..., numtrt+1)
+    trt: number of standard doses, array table.shape[:-1]
+
+    Outputs:
+    reduction: reductions of trt standard doses (NaN for treatments outside the table, as in sbp_reductions_generic)
+    """
+
+    trt = np.asarray(trt)
+    valid = (trt >= 0) & (trt < table.shape[-1])
+    reduction = np.take_along_axis(table, np.where(valid, trt, 0).astype(int)[..., None], axis=-1)[..., 0]
+
+    return np.where(valid, reduction, np.nan)
@@ -0,0 +1,81 @@
+# =======================================================
+# Per-stage timing of the patient simulation
+# =======================================================
+
+# Loading modules
+import json  # summary files
+import time  # wall clock
+from contextlib import contextmanager, nullcontext  # timed blocks
+
+# Stages of the patient simulation, in pipeline order
+STAGES = ["risks", "transitions", "mdp setup", "optimal policy", "monotone policy", "guideline policies", "feasibility projection",
+          "evaluation"]
+
+# Wall time and number of calls per stage
+class StageTimer:
+    """
+    Accumulates the wall time and number of calls of each stage of the patient simulation
+
+    Timers of worker processes can be sent back as dictionaries (as_dict) and merged into a cohort-wide timer (merge)
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+
+    # Timing a block of code
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    # Recording time spent outside a timed block
+    def add(self, name, seconds, calls=1):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    # Aggregating timers (e.g., of worker processes)
+    def merge(self, other):
+        """Add the times and calls of another StageTimer (or of its as_dict output)"""
+
+        if isinstance(other, StageTimer):
+            other = other.as_dict()
+        for name, record in other.items():
+            self.add(name, record["seconds"], record["calls"])
+
+        return self
+
+    def as_dict(self):
+        """Dictionary of {stage: {"calls": ..., "seconds": ...}}, in the order of STAGES and then of first use"""
+
+        names = [name for name in STAGES if name in self.seconds] + \
+                [name for name in self.seconds if name not in STAGES]
+
+        return {name: {"calls": self.calls[name], "seconds": self.seconds[name]} for name in names}
+
+    def summary(self):
+        """Table of calls, total and mean wall time, and share of the total time per stage"""
+
+        records = self.as_dict()
+        total = sum(record["seconds"] for record in records.values())
+        lines = [f"{'Stage':<24} {'Calls':>8} {'Total (s)':>11} {'Mean (ms)':>11} {'Share':>7}"]
+        for name, record in records.items():
+            lines.append(f"{name:<24} {record['calls']:>8d} {record['seconds']:>11.3f} "
+                         f"{1000*record['seconds']/max(record['calls'], 1):>11.3f} "
+                         f"{record['seconds']/total if total > 0 else 0:>7.1%}")
+        lines.append(f"{'total':<24} {'':>8} {total:>11.3f}")
+
+        return "\n".join(lines)
+
+    def save_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+# Timing a block of code if a timer is given
+def timed(timer, name):
+    """timer.stage(name), or a block that records nothing if timer is None"""
+
+    return nullcontext() if timer is None else timer.stage(name)
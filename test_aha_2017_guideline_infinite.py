@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script for aha_2017_guideline_infinite.py using randomly generated patients
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from aha_2017_guideline_infinite import aha_guideline_infinite, aha_guideline_batch
+
+def random_patients(N, seed=0):
+    """Random 10-year risks (N x S x E), pre-treatment BP (N x S), and risk slopes (N x E)"""
+
+    rng = np.random.default_rng(seed)
+    pretrtrisk = rng.random((N, 10, 2))*rng.choice([0.02, 0.1, 0.5], (N, 1, 1))
+    pretrtsbp = np.repeat(rng.uniform(90, 220, (N, 1)), 10, axis=1)
+    pretrtdbp = np.repeat(rng.uniform(40, 130, (N, 1)), 10, axis=1)
+    riskslope = rng.uniform(0.3, 0.8, (N, 2))
+
+    return pretrtrisk, pretrtsbp, pretrtdbp, riskslope
+
+def check_batch(pretrtrisk, pretrtsbp, pretrtdbp, targetrisk, targetsbp, targetdbp, sbpmin, dbpmin, riskslope, numtrt):
+    """Compare the batched guideline with the per-patient loop, returning the batched policies"""
+
+    policy = aha_guideline_batch(pretrtrisk, pretrtsbp, pretrtdbp, targetrisk, targetsbp, targetdbp,
+                                 sbpmin, dbpmin, riskslope, numtrt, [0])
+    for n in range(pretrtrisk.shape[0]):
+        expected = aha_guideline_infinite(pretrtrisk[n], pretrtsbp[n], pretrtdbp[n], targetrisk, targetsbp,
+                                          targetdbp, sbpmin, dbpmin, pd.DataFrame(riskslope[n].reshape(1, 2)),
+                                          numtrt, [0])
+        assert np.array_equal(policy[n], expected, equal_nan=True)
+
+    return policy
+
+def test_aha_guideline_batch():
+    """The batched guideline should reproduce the per-patient titration exactly across targets, BP floors and medication limits"""
+
+    pretrtrisk, pretrtsbp, pretrtdbp, riskslope = random_patients(100)
+    for targetrisk, targetsbp, targetdbp in [(0.1, 130, 80), (0.05, 120, 70), (0.2, 140, 90)]:
+        for sbpmin, dbpmin in [(120, 55), (100, 40), (140, 70)]:
+            for numtrt in (0, 1, 3, 5, 7):
+                check_batch(pretrtrisk, pretrtsbp, pretrtdbp, targetrisk, targetsbp, targetdbp, sbpmin, dbpmin,
+                            riskslope, numtrt)
+
+def test_aha_guideline_batch_dead_states():
+    """Dead states (zero risk), missing risks, and states left without a recommendation (NaN) should match the loop"""
+
+    pretrtrisk, pretrtsbp, pretrtdbp, riskslope = random_patients(300, seed=1)
+    pretrtrisk[:, 6:] = 0  # dead states
+    pretrtrisk[::7, 0, 1] = np.nan  # missing risks
+    found_nan = False
+    for targetsbp, targetdbp in [(130, 80), (150, 95)]:  # BP targets above the stage 1 thresholds leave states untitrated
+        for numtrt in (0, 5):
+            policy = check_batch(pretrtrisk, pretrtsbp, pretrtdbp, 0.1, targetsbp, targetdbp, 120, 55, riskslope, numtrt)
+            found_nan |= np.isnan(policy).any()
+    assert found_nan  # the untitrated (NaN) states are exercised
+
+if __name__ == "__main__":
+    test_aha_guideline_batch()
+    test_aha_guideline_batch_dead_states()
+    print("🎉 All tests passed! AHA guideline policies are working correctly.")
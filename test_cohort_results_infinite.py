@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test script for the columnar result store (cohort_results_infinite.py)
+"""
+
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from cohort_results_infinite import CohortResults, RESULT_FIELDS
+
+def random_result(pt_id, numhealth, numtrt, rng):
+    """Result tuple in the layout of patient_sim_infinite_no_gurobi, with random values"""
+
+    values = {"id": pt_id, "state": rng.random(numhealth), "policy": rng.integers(0, numtrt, numhealth),
+              "occupancy": rng.random((numhealth, numtrt)), "scalar": rng.random(),
+              "count": rng.integers(0, numhealth)}
+    return tuple(values[kind] for _, kind in RESULT_FIELDS)
+
+def test_cohort_results_round_trip():
+    """Stored results should survive save and load with their types, patient ids, and weights"""
+
+    rng = np.random.default_rng(0)
+    numhealth, numtrt = 10, 6
+    pt_ids = [12, 3, 40]
+    results = [random_result(pt_id, numhealth, numtrt, rng) for pt_id in pt_ids]
+    wts = [1.5, 2.0, 3.25]
+
+    for store_numtrt in (numtrt, None):
+        store = CohortResults(5, numhealth, store_numtrt)
+        for result, wt in zip(results, wts):
+            assert store.append(result, wt)
+        assert not store.append(None)  # failed patients are skipped
+        assert len(store) == len(pt_ids)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "results.npz")
+            store.save(path)
+            loaded = CohortResults.load(path)
+
+        assert len(loaded) == len(pt_ids) and loaded.numhealth == numhealth and loaded.numtrt == store_numtrt
+        assert np.array_equal(loaded["pt_id"], pt_ids) and loaded["pt_id"].dtype == np.int64
+        assert np.array_equal(loaded["wt"], wts)
+        for f, (name, kind) in enumerate(RESULT_FIELDS):
+            if kind == "occupancy" and store_numtrt is None:
+                assert name not in loaded.columns  # occupancy measures are not stored without numtrt
+                continue
+            expected = np.array([result[f] for result in results])
+            assert np.array_equal(loaded[name], expected)
+            assert loaded[name].dtype == (np.int64 if kind in ("id", "policy", "count") else np.float64)
+
+    # Appending beyond the preallocated size
+    store = CohortResults(1, numhealth, numtrt)
+    store.append(results[0])
+    try:
+        store.append(results[1])
+        assert False, "appending to a full store should fail"
+    except IndexError:
+        pass
+
+if __name__ == "__main__":
+    test_cohort_results_round_trip()
+    print("🎉 All tests passed! Cohort result storage is working correctly.")
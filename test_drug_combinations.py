@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script for the drug combination action space and the feasibility projection of policies
+in number of medications (drug_combinations.py)
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from math import comb
+from drug_combinations import drug_combinations, meds_per_action, action_classes_by_meds, meds_to_actions, \
+    feasible_meds_mask, project_feasible_meds, bp_reductions, DRUG_CLASSES
+from sbp_reductions_drugtype import sbp_reductions, sbp_reductions_array, SBP_DRUG_ORDER
+from dbp_reductions_drugtype import dbp_reductions, dbp_reductions_array, DBP_DRUG_ORDER
+
+def test_drug_combinations():
+    """Every combination of up to 5 medications from 5 drug classes, grouped by number of medications"""
+
+    alldrugs = drug_combinations()
+    assert len(alldrugs) == 252 and alldrugs[0] == "NT"
+    assert len(set(alldrugs)) == len(alldrugs)  # no repeated combinations
+    assert all(d in DRUG_CLASSES for option in alldrugs[1:] for d in option)
+
+    # Number of medications per treatment option
+    meds = meds_per_action(alldrugs)
+    assert meds[0] == 0 and all(meds[a] == len(option) for a, option in enumerate(alldrugs[1:], start=1))
+    assert np.all(np.diff(meds) >= 0)  # sorted by number of medications
+    assert np.array_equal(meds_per_action(["NT", "ACE", "ARB", "BB", "CCB", "TH"]), [0, 1, 1, 1, 1, 1])
+
+    # Treatment options grouped by number of medications
+    action_class_meds = action_classes_by_meds(alldrugs, 5)
+    assert [len(options) for options in action_class_meds] == [comb(5+m-1, m) for m in range(6)]  # 1, 5, 15, 35, 70, 126
+    assert sorted(a for options in action_class_meds for a in options) == list(range(len(alldrugs)))
+    assert all(meds[a] == m for m, options in enumerate(action_class_meds) for a in options)
+
+    # Limiting the number of medications of the same class
+    limited = drug_combinations(max_per_class=1)
+    assert len(limited) == 1 + sum(comb(5, m) for m in range(1, 6))
+    assert all(max(option.count(d) for d in DRUG_CLASSES) == 1 for option in limited[1:])
+
+def test_bp_reductions():
+    """Closed-form BP reductions should match the dose-by-dose reductions of every combination"""
+
+    alldrugs = drug_combinations()
+    pretrtsbp = np.linspace(90, 220, 27)
+    pretrtdbp = np.linspace(40, 130, 27)
+    expected_sbp = np.array([[sbp_reductions(a, sbp, alldrugs) if a > 0 else 0 for a in range(len(alldrugs))]
+                             for sbp in pretrtsbp])
+    expected_dbp = np.array([[dbp_reductions(a, dbp, alldrugs) if a > 0 else 0 for a in range(len(alldrugs))]
+                             for dbp in pretrtdbp])
+
+    # Reductions from arrays of drug counts
+    counts = np.array([[option.count(d) for d in SBP_DRUG_ORDER] for option in alldrugs[1:]])
+    assert SBP_DRUG_ORDER == DBP_DRUG_ORDER
+    assert np.allclose(sbp_reductions_array(counts, pretrtsbp[:, None]), expected_sbp[:, 1:], rtol=0, atol=1e-12)
+    assert np.allclose(dbp_reductions_array(counts, pretrtdbp[:, None]), expected_dbp[:, 1:], rtol=0, atol=1e-12)
+
+    # Reductions of every treatment option (including no treatment)
+    sbpreduc, dbpreduc = bp_reductions(alldrugs, pretrtsbp, pretrtdbp)
+    assert sbpreduc.shape == dbpreduc.shape == (len(pretrtsbp), 252)
+    assert np.allclose(sbpreduc, expected_sbp, rtol=0, atol=1e-12)
+    assert np.allclose(dbpreduc, expected_dbp, rtol=0, atol=1e-12)
+
+def test_meds_to_actions():
+    """Numbers of medications should map to the first feasible option with that number of medications"""
+
+    # Single-drug action space (option m is the only option with m medications in the case study)
+    action_class_meds = [[a] for a in range(6)]
+    feas = np.ones((10, 6))
+    policy = np.array([0, 1, 2, 3, 4, 5, 0, 0, 0, 0])
+    assert np.array_equal(meds_to_actions(policy, action_class_meds, feas), policy)
+    feas[1, 1] = 0  # the only option is kept even if infeasible
+    assert np.array_equal(meds_to_actions(policy, action_class_meds, feas), policy)
+
+    # Combination action space
+    alldrugs = drug_combinations()
+    action_class_meds = action_classes_by_meds(alldrugs, 5)
+    feas = np.ones((10, len(alldrugs)))
+    policy = np.array([0, 1, 2, 3, 4, 5, 1, 2, 3, 5])
+    actions = meds_to_actions(policy, action_class_meds, feas)
+    assert np.array_equal(actions, [action_class_meds[m][0] for m in policy])  # first option with m medications
+    assert np.array_equal(meds_per_action(alldrugs)[actions], policy)
+
+    feas[1, action_class_meds[1][:2]] = 0  # first two single drugs infeasible
+    feas[2, action_class_meds[2]] = 0  # no feasible option with 2 medications
+    actions = meds_to_actions(policy, action_class_meds, feas)
+    assert actions[1] == action_class_meds[1][2] and actions[2] == action_class_meds[2][0]
+
+def test_project_feasible_meds():
+    """Projected policies should match a state-by-state repair, for a stack of patients and policies at once"""
+
+    rng = np.random.default_rng(0)
+    alldrugs = drug_combinations(); numeds = 5
+    action_class_meds = action_classes_by_meds(alldrugs, numeds)
+    N, K, S = 20, 3, 10
+    feas = (rng.random((N, S, len(alldrugs))) < rng.choice([0.01, 0.1, 0.8], size=(N, 1, 1))).astype(float)
+    feas[..., 0] = 1  # no treatment is always feasible
+    policies = rng.integers(0, numeds+1, size=(K, N, S)).astype(float)
+
+    meds_mask = feasible_meds_mask(feas, action_class_meds, numeds)
+    assert meds_mask.shape == (N, S, numeds+1)
+    projected, repairs = project_feasible_meds(policies, meds_mask)
+    assert projected.shape == policies.shape and repairs.shape == (K, N)
+
+    for k in range(K):
+        for n in range(N):
+            for s in range(S):
+                feasible = [m for m in range(numeds+1) if feas[n, s, action_class_meds[m]].any()]
+                m = policies[k, n, s]
+                expected = m if m in feasible else m+1 if m+1 in feasible else m-1 if m-1 in feasible else max(feasible)
+                assert projected[k, n, s] == expected
+            assert repairs[k, n] == (projected[k, n] != policies[k, n]).sum()
+
+    # Treatment options of every feasible policy are feasible, and batched mapping matches each patient's mapping
+    actions = meds_to_actions(projected, action_class_meds, feas)
+    assert np.all(np.take_along_axis(np.broadcast_to(feas, (K,) + feas.shape), actions[..., None], axis=-1) == 1)
+    for n in range(N):
+        assert np.array_equal(actions[0, n], meds_to_actions(projected[0, n], action_class_meds, feas[n]))
+
+if __name__ == "__main__":
+    test_drug_combinations()
+    test_bp_reductions()
+    test_meds_to_actions()
+    test_project_feasible_meds()
+    print("🎉 All tests passed! Drug combinations and feasibility projection are working correctly.")
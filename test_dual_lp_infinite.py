@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Test script for dual_lp_infinite.py using randomly generated MDPs
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from dual_lp_infinite import dual_lp_infinite, occupancy_infinite
+from test_policy_evaluation_infinite import random_mdps
+
+def test_dual_lp_optimality():
+    """The solution should be primal feasible, dual feasible, and have no duality gap"""
+
+    gamma = 0.97
+    P, r = random_mdps(10)
+    N, S, A = r.shape
+    alpha = np.full(S, 1/S)
+    x, V, obj = dual_lp_infinite(P, r, alpha, gamma)
+
+    # Primal feasibility: flow balance and non-negativity
+    inflow = gamma*np.einsum('nsja,nsa->nj', P, x)
+    assert np.allclose(x.sum(axis=2) - inflow, alpha[None, :])
+    assert (x >= 0).all()
+
+    # Dual feasibility: no positive reduced costs
+    Q = r + gamma*np.einsum('nsja,nj->nsa', P, V)
+    assert (Q - V[..., None] <= 1e-8).all()
+
+    # Strong duality
+    assert np.allclose(obj, V @ alpha)
+
+    # Single MDPs should match the batch
+    for n in range(N):
+        x_n, V_n, obj_n = dual_lp_infinite(P[n], r[n], alpha, gamma)
+        assert np.allclose(x_n, x[n]) and np.isclose(obj_n, obj[n])
+        pi_n = x_n.argmax(axis=1)
+        assert np.allclose(occupancy_infinite(pi_n, P[n], alpha, gamma), x_n)
+
+if __name__ == "__main__":
+    test_dual_lp_optimality()
+    print("🎉 All tests passed! Dual linear program is working correctly.")
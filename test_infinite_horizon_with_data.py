@@ -8,8 +8,10 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import numpy as np
-import pandas as pd
 from patient_simulation_infinite_no_gurobi import patient_sim_infinite_no_gurobi
+from life_tables import LifeTables
+from nhanes_cache import load_nhanes_cache
+from cohort_runner_infinite import load_lookup_tables
 
 def test_with_actual_data():
     """Test the infinite horizon MDP with actual patient data"""
@@ -20,27 +22,18 @@ def test_with_actual_data():
     try:
         # Load data
         print("Loading data...")
-        os.chdir('Data')
         
-        # Load life expectancy and death likelihood data
-        lifedata = pd.read_csv('lifedata.csv', header=None)
-        strokedeathdata = pd.read_csv('strokedeathdata.csv', header=None)
-        chddeathdata = pd.read_csv('chddeathdata.csv', header=None)
-        alldeathdata = pd.read_csv('alldeathdata.csv', header=None)
-        riskslopedata = pd.read_csv('riskslopes.csv', header=None)
+        # Load life expectancy, death likelihood, and risk slope data (as age-indexed lookup arrays)
+        tables = load_lookup_tables()
+        lifetables = LifeTables(**tables)
         
-        # Load patient data
-        os.chdir('Continuous NHANES')
-        ptdata = pd.read_csv('Continuous NHANES Forecasted Dataset.csv')
+        # Load patient data (memory-mapped cache of the NHANES forecasted dataset)
+        cache = load_nhanes_cache()
         
         print(f"✅ Data loaded successfully!")
-        print(f"   - Patient data: {len(ptdata)} records")
-        print(f"   - Life data: {len(lifedata)} records")
-        print(f"   - Risk slope data: {len(riskslopedata)} records")
-        
-        # Go back to main directory
-        os.chdir('..')
-        os.chdir('..')
+        print(f"   - Patients: {len(cache.ids)}")
+        print(f"   - Life data: {len(tables['lifedata'])} records")
+        print(f"   - Risk slope data: {len(tables['riskslopedata'])} records")
         
         # Set up parameters (simplified version)
         numhealth = 10
@@ -112,9 +105,9 @@ def test_with_actual_data():
         
         # Test with first patient
         pt_id = 0
-        patient_data = ptdata[ptdata.id == pt_id]
-        
-        if len(patient_data) == 0:
+        try:
+            patient_data = cache.patient(pt_id)
+        except KeyError:
             print("❌ No patient data found for patient ID 0")
             return False
         
@@ -126,12 +119,12 @@ def test_with_actual_data():
         # Run patient simulation
         result = patient_sim_infinite_no_gurobi(
             pt_id, patient_data, numhealth, healthy, dead, events,
-            stroke_hist, ascvd_hist, event_states, lifedata, mortality_rates,
-            chddeathdata, strokedeathdata, alldeathdata, riskslopedata,
+            stroke_hist, ascvd_hist, event_states, tables["lifedata"], mortality_rates,
+            tables["chddeathdata"], tables["strokedeathdata"], tables["alldeathdata"], tables["riskslopedata"],
             sbpmin, dbpmin, sbpmax, dbpmax, alldrugs, trtharm,
             QoL, QoLterm, alpha, gamma, state_order, S_class,
             action_order, A_class, action_class_meds, targetrisk, targetdiff,
-            targetsbp, targetdbp, numeds, reference_age_index=0
+            targetsbp, targetdbp, numeds, reference_age_index=0, lifetables=lifetables
         )
         
         if result is not None:
@@ -139,7 +132,8 @@ def test_with_actual_data():
             print(f"Results: {len(result)} outputs")
             
             # Extract key results
-            pt_id, V_notrt, e_notrt, V_opt, d_opt, occup, J_opt, V_mopt, d_mopt, J_mopt, V_aha, d_aha, J_aha, e_aha, V_risk, d_risk, J_risk, e_risk = result
+            pt_id, V_notrt, e_notrt, V_opt, d_opt, occup, J_opt, V_mopt, d_mopt, J_mopt, V_aha, d_aha, J_aha, e_aha, V_risk, d_risk, J_risk, e_risk, e_opt, e_mopt, \
+                ly_notrt, ly_opt, ly_mopt, ly_aha, ly_risk, repairs_aha, repairs_risk = result
             
             print(f"\\nKey Results:")
             print(f"  - Optimal policy value: {J_opt:.4f}")
@@ -147,11 +141,14 @@ def test_with_actual_data():
             print(f"  - AHA policy value: {J_aha:.4f}")
             print(f"  - Risk-based policy value: {J_risk:.4f}")
             print(f"  - No treatment value: {np.dot(alpha, V_notrt):.4f}")
+            print(f"  - Expected events averted by the optimal policy: {np.dot(alpha, e_notrt - e_opt):.4f}")
+            print(f"  - Life-years gained by the optimal policy: {np.dot(alpha, ly_opt - ly_notrt):.4f}")
             
             print(f"\\nOptimal policy: {d_opt}")
             print(f"Monotone policy: {d_mopt}")
             print(f"AHA policy: {d_aha}")
             print(f"Risk-based policy: {d_risk}")
+            print(f"Guideline states repaired for feasibility: {repairs_aha} (AHA), {repairs_risk} (risk-based)")
             
             return True
         else:
@@ -164,7 +161,115 @@ def test_with_actual_data():
         traceback.print_exc()
         return False
 
+def test_occupancy_action_order():
+    """Occupancy measures should be returned in the order of alldrugs, lining up with the optimal policy"""
+
+    from cohort_runner_infinite import load_lookup_tables, cohort_parameters
+    from nhanes_cache import load_nhanes_cache
+
+    tables = load_lookup_tables()
+    params = cohort_parameters()
+    cache = load_nhanes_cache()
+    numtrt = len(params["alldrugs"])
+    natural = patient_sim_infinite_no_gurobi(0, cache.patient(0), verbose=False, **tables, **params)
+    reordered = patient_sim_infinite_no_gurobi(0, cache.patient(0), verbose=False, **tables,
+                                               **dict(params, action_order=list(range(numtrt))[::-1]))
+    for d_opt, occup in ((natural[4], natural[5]), (reordered[4], reordered[5])):
+        on_policy = np.zeros(occup.shape, dtype=bool)
+        on_policy[np.arange(len(d_opt)), d_opt] = True
+        assert np.all(occup[~on_policy] == 0) and np.all(occup[on_policy] >= 0)
+    alive = np.isin(np.arange(params["numhealth"]), params["dead"], invert=True)  # dead states are not treated
+    assert np.array_equal(natural[4][alive], reordered[4][alive])
+    assert np.allclose(natural[5][alive], reordered[5][alive])
+
+def test_cohort_pipeline():
+    """Streaming the cohort in chunks should match the patient simulation run one patient at a time"""
+
+    from cohort_pipeline_infinite import run_cohort_pipeline
+    from cohort_runner_infinite import load_lookup_tables, cohort_parameters
+    from nhanes_cache import load_nhanes_cache
+
+    tables = load_lookup_tables()
+    params = cohort_parameters()
+    cache = load_nhanes_cache()
+    pt_ids = cache.ids[:10]
+    streamed = list(run_cohort_pipeline(pt_ids, tables, params, chunk_size=4))
+    assert [result[0] for result in streamed] == list(pt_ids)
+    for pt_id, result in zip(pt_ids, streamed):
+        expected = patient_sim_infinite_no_gurobi(pt_id, cache.patient(pt_id), verbose=False, **tables, **params)
+        assert all(np.array_equal(a, b) for a, b in zip(result, expected))
+
+def test_risk_threshold_sweep():
+    """Each threshold of a sweep should match the pipeline run with that risk threshold"""
+
+    from cohort_pipeline_infinite import run_cohort_pipeline, sweep_risk_thresholds
+    from cohort_runner_infinite import load_lookup_tables, cohort_parameters
+
+    tables = load_lookup_tables()
+    params = cohort_parameters()
+    pt_ids = list(range(8))
+    thresholds = np.array([0.05, 0.1, 0.2])
+    sweep = sweep_risk_thresholds(thresholds, pt_ids, tables, params, chunk_size=3)
+    assert sweep["d_risk"].shape == (len(thresholds), len(pt_ids), params["numhealth"])
+    for t, threshold in enumerate(thresholds):
+        streamed = run_cohort_pipeline(pt_ids, tables, dict(params, targetrisk=threshold), chunk_size=3)
+        for n, result in enumerate(streamed):
+            assert np.array_equal(sweep["d_risk"][t, n], result[15])  # risk-based policy
+            assert np.allclose(sweep["V_risk"][t, n], result[14]) and np.isclose(sweep["J_risk"][t, n], result[16])
+            assert sweep["repairs"][t, n] == result[26]  # risk-based states repaired
+
+def test_cohort_runner():
+    """Seeded process-pool runs should not depend on the shard size or number of workers, and should match
+    the streaming pipeline"""
+
+    from cohort_runner_infinite import run_cohort, load_lookup_tables, cohort_parameters
+    from cohort_pipeline_infinite import run_cohort_pipeline
+
+    tables = load_lookup_tables()
+    params = cohort_parameters()
+    pt_ids = list(range(10))
+    expected = list(run_cohort_pipeline(pt_ids, tables, params, chunk_size=4, seed=7))
+    for max_workers, shard_size in ((1, 10), (2, 3), (3, 1)):
+        results = {result[0]: result for result in run_cohort(pt_ids, tables, params, max_workers=max_workers,
+                                                              shard_size=shard_size, seed=7)}
+        assert sorted(results) == pt_ids
+        for result in expected:
+            assert all(np.array_equal(a, b) for a, b in zip(results[result[0]], result))
+
+def test_stage_timing():
+    """Timing the pipeline stages should not change results, and should count chunks and patients per stage"""
+
+    from cohort_pipeline_infinite import run_cohort_pipeline
+    from cohort_runner_infinite import load_lookup_tables, cohort_parameters
+    from stage_timing import StageTimer, STAGES
+
+    tables = load_lookup_tables()
+    params = cohort_parameters()
+    pt_ids = list(range(6))
+    timer = StageTimer()
+    timed_results = list(run_cohort_pipeline(pt_ids, tables, params, chunk_size=4, timer=timer))
+    for result, expected in zip(timed_results, run_cohort_pipeline(pt_ids, tables, params, chunk_size=4)):
+        assert all(np.array_equal(a, b) for a, b in zip(result, expected))
+
+    records = timer.as_dict()
+    assert list(records) == STAGES
+    assert records["risks"]["calls"] == 2 and records["optimal policy"]["calls"] == len(pt_ids)  # chunks and patients
+    assert records["guideline policies"]["calls"] == 2  # precomputed per chunk, not again per patient
+    assert records["feasibility projection"]["calls"] == 2
+    assert all(record["seconds"] >= 0 for record in records.values())
+
+    # Aggregating timers (e.g., of worker processes)
+    merged = StageTimer().merge(timer).merge(timer.as_dict())
+    assert merged.calls["evaluation"] == 2*len(pt_ids)
+    assert np.isclose(merged.seconds["monotone policy"], 2*timer.seconds["monotone policy"])
+    assert "optimal policy" in merged.summary()
+
 if __name__ == "__main__":
+    test_occupancy_action_order()
+    test_cohort_pipeline()
+    test_risk_threshold_sweep()
+    test_cohort_runner()
+    test_stage_timing()
     success = test_with_actual_data()
     if success:
         print("\\n🎉 All tests passed! Infinite horizon MDP is working correctly.")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test script for the age-indexed lookup arrays (life_tables.py)
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from life_tables import LifeTables
+from cohort_runner_infinite import load_lookup_tables
+
+def test_life_tables():
+    """Lookups should match the np.where-based row searches of the data frames, including the first and last ages"""
+
+    tables = load_lookup_tables()
+    lifetables = LifeTables(**tables)
+    ages = tables["lifedata"].iloc[:, 0].to_numpy(dtype=int)
+    assert (lifetables.min_age, lifetables.max_age) == (ages[0], ages[-1])
+
+    lookups = [(lifetables.life_expectancy, tables["lifedata"]), (lifetables.chddeath, tables["chddeathdata"]),
+               (lifetables.strokedeath, tables["strokedeathdata"]), (lifetables.alldeath, tables["alldeathdata"])]
+    for age in ages:  # every age, including the age boundaries
+        for sex in (0, 1):
+            sexcol = 1 if sex == 1 else 2  # column in deathdata corresponding to each sex
+            for lookup, data in lookups:
+                assert lookup(age, sex) == data.iloc[np.where(data.iloc[:, 0] == age)[0][0], sexcol]
+        riskslopedata = tables["riskslopedata"]
+        expected = riskslopedata.iloc[np.where(riskslopedata.iloc[:, 0] == age)[0][0], 1:3]
+        assert np.array_equal(lifetables.riskslopes(age), expected.to_numpy(dtype=float))
+
+    # Arrays of ages and sexes
+    sexes = np.arange(len(ages)) % 2
+    for lookup, data in lookups:
+        expected = [data.iloc[np.where(data.iloc[:, 0] == age)[0][0], 1 if sex == 1 else 2] for age, sex in zip(ages, sexes)]
+        assert np.array_equal(lookup(ages, sexes), expected)
+    assert lifetables.riskslopes(ages).shape == (len(ages), 2)
+
+    # Ages outside the tables
+    for age in (ages[0] - 1, ages[-1] + 1):
+        try:
+            lifetables.chddeath(age, 1)
+            assert False, "ages outside the tables should raise ValueError"
+        except ValueError:
+            pass
+
+if __name__ == "__main__":
+    test_life_tables()
+    print("🎉 All tests passed! Lookup arrays are working correctly.")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the memory-mapped cache of the NHANES forecasted dataset (nhanes_cache.py)
+"""
+
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from nhanes_cache import load_nhanes_cache, NHANES_CSV
+
+def test_patient_rows():
+    """Cached patient rows should match filtering the forecasted dataset by patient id"""
+
+    ptdata = pd.read_csv(NHANES_CSV)
+    cache = load_nhanes_cache()
+    assert np.array_equal(cache.ids, np.unique(ptdata.id))
+
+    pt_ids = np.concatenate((cache.ids[:50], cache.ids[-50:], cache.ids[::97]))
+    for pt_id in pt_ids:
+        expected = ptdata[ptdata.id == pt_id]
+        patient = cache.patient(pt_id)
+        assert list(patient.columns) == list(ptdata.columns)
+        assert np.array_equal(patient.to_numpy(), expected.to_numpy())
+        assert all(patient[col].dtype == expected[col].dtype for col in ptdata.columns)
+
+    # Reference rows and first rows of every patient
+    first = ptdata.groupby('id', sort=True).head(1)
+    assert np.array_equal(cache.first_rows('wt'), first.wt.to_numpy())
+    assert np.array_equal(cache.reference_rows(pt_ids).to_numpy(),
+                          np.stack([ptdata[ptdata.id == pt_id].iloc[0].to_numpy() for pt_id in pt_ids]))
+
+    # Unknown patients
+    for pt_id in (cache.ids.min() - 1, cache.ids.max() + 1):
+        try:
+            cache.patient(pt_id)
+            assert False, "unknown patients should raise KeyError"
+        except KeyError:
+            pass
+
+def test_cache_rebuild():
+    """The cache should be built from unsorted data and rebuilt when the dataset is newer than the cache"""
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_path = os.path.join(tmpdir, 'data.csv'); cache_dir = os.path.join(tmpdir, 'cache')
+        ptdata = pd.DataFrame({'id': [5, 2, 5, 2, 9], 'age': [40, 50, 41, 51, 60], 'sbp': [120.5, 130, 121, 131, 140]})
+        ptdata.to_csv(csv_path, index=False)
+
+        cache = load_nhanes_cache(csv_path, cache_dir)
+        assert np.array_equal(cache.ids, [2, 5, 9])
+        assert np.array_equal(cache.patient(5).to_numpy(), ptdata[ptdata.id == 5].to_numpy())
+        try:
+            cache.patient(3)  # id within the index range without data
+            assert False, "unknown patients should raise KeyError"
+        except KeyError:
+            pass
+
+        # Updating the dataset
+        ptdata.loc[ptdata.id == 9, 'sbp'] = 150.0
+        ptdata = pd.concat([ptdata, pd.DataFrame({'id': [1], 'age': [45], 'sbp': [125.0]})])
+        ptdata.to_csv(csv_path, index=False)
+        index_time = os.path.getmtime(os.path.join(cache_dir, 'index_offsets.npy'))
+        os.utime(csv_path, (index_time + 10, index_time + 10))
+
+        cache = load_nhanes_cache(csv_path, cache_dir)
+        assert np.array_equal(cache.ids, [1, 2, 5, 9])
+        assert cache.patient(9).sbp.tolist() == [150.0]
+        assert cache.patient(1).age.tolist() == [45]
+
+if __name__ == "__main__":
+    test_patient_rows()
+    test_cache_rebuild()
+    print("🎉 All tests passed! NHANES cache is working correctly.")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for policy_evaluation_infinite.py using randomly generated MDPs
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from policy_evaluation_infinite import evaluate_pi_infinite, evaluate_events_infinite, policy_improvement_infinite, \
+    policy_improvement_batch, bellman_q, policy_transitions, PolicyEvaluationContext
+
+def random_mdps(N, S=10, A=6, seed=0):
+    """Generate N random MDPs with transition probabilities (N x S x S x A) and rewards (N x S x A)"""
+
+    rng = np.random.default_rng(seed)
+    P = rng.random((N, S, S, A))
+    P = P/P.sum(axis=2, keepdims=True)
+    r = rng.random((N, S, A))
+
+    return P, r
+
+def test_evaluate_pi_direct():
+    """Exact policy evaluation should match value iteration up to its tolerance"""
+
+    gamma = 0.97
+    P, r = random_mdps(5)
+    for n in range(P.shape[0]):
+        pi = np.arange(P.shape[1]) % P.shape[3]
+        V_direct = evaluate_pi_infinite(pi, P[n], r[n], gamma, method="direct")
+        V_iter = evaluate_pi_infinite(pi, P[n], r[n], gamma, max_iterations=5000, tolerance=1e-10, method="iterative")
+        assert np.allclose(V_direct, V_iter, atol=1e-6)
+        assert np.allclose(V_direct, r[n, np.arange(P.shape[1]), pi] + gamma*P[n, np.arange(P.shape[1]), :, pi] @ V_direct)
+
+def test_evaluate_pi_stack():
+    """Evaluating a stack of policies should match evaluating each policy"""
+
+    gamma = 0.97
+    P, r = random_mdps(1)
+    P, r = P[0], r[0]
+    policies = np.random.default_rng(2).integers(0, P.shape[2], (4, P.shape[0]))
+    for method in ("direct", "iterative"):
+        V_stack = evaluate_pi_infinite(policies, P, r, gamma, max_iterations=5000, tolerance=1e-10, method=method)
+        E_stack = evaluate_events_infinite(policies, P, np.ones(P.shape[0]), gamma, max_iterations=5000, tolerance=1e-10)
+        assert V_stack.shape == policies.shape and np.allclose(E_stack, 1/(1-gamma), atol=1e-6)
+        for k, pi in enumerate(policies):
+            assert np.allclose(V_stack[k], evaluate_pi_infinite(pi, P, r, gamma, method="direct"), atol=1e-6)
+
+def test_bellman_kernel():
+    """Vectorized Bellman backups should match state-by-state backups, for single and batched MDPs"""
+
+    gamma = 0.97
+    P, r = random_mdps(3)
+    V = np.random.default_rng(1).random((3, P.shape[1]))
+    Q_batch = bellman_q(P, r, V, gamma)
+    pi = np.argmax(Q_batch, axis=2)
+    P_batch = policy_transitions(P, pi)
+    for n in range(P.shape[0]):
+        Q_loop = np.array([[r[n, s, a] + gamma*np.dot(P[n, s, :, a], V[n]) for a in range(P.shape[3])]
+                           for s in range(P.shape[1])])
+        assert np.allclose(bellman_q(P[n], r[n], V[n], gamma), Q_loop) and np.allclose(Q_batch[n], Q_loop)
+        assert np.allclose(bellman_q(P[n], r[n], V, gamma)[n], Q_loop)  # several value functions for one MDP
+        assert np.allclose(P_batch[n], policy_transitions(P[n], pi[n]))
+
+    # Expected events of a policy should solve (I - gamma*P_pi)E = event indicators
+    event_states = (np.arange(P.shape[1]) % 3 == 0).astype(float)
+    E = evaluate_events_infinite(pi[0], P[0], event_states, gamma, max_iterations=5000, tolerance=1e-10)
+    assert np.allclose(E, np.linalg.solve(np.eye(P.shape[1]) - gamma*P_batch[0], event_states), atol=1e-6)
+
+def test_policy_evaluation_context():
+    """Cached evaluations should match direct solves and factorise identical policies once"""
+
+    gamma = 0.97
+    P, r = random_mdps(1)
+    P, r = P[0], r[0]
+    S = P.shape[0]
+    event_states = (np.arange(S) % 3 == 0).astype(float)
+    policies = np.array([np.zeros(S, dtype=int), np.arange(S) % P.shape[2], np.zeros(S, dtype=int)])
+    evaluation = PolicyEvaluationContext(P, gamma, {"qaly": r, "events": event_states, "lifeyears": np.ones(S)})
+    values = evaluation.evaluate(policies)
+
+    assert len(evaluation) == 2
+    for k, pi in enumerate(policies):
+        I_P = np.eye(S) - gamma*policy_transitions(P, pi)
+        assert np.allclose(values["qaly"][k], np.linalg.solve(I_P, r[np.arange(S), pi]))
+        assert np.allclose(values["events"][k], np.linalg.solve(I_P, event_states))
+        assert np.allclose(values["lifeyears"][k], 1/(1-gamma))
+    assert np.allclose(evaluation.evaluate(policies[1])["qaly"], values["qaly"][1]) and len(evaluation) == 2
+
+def test_policy_improvement_batch():
+    """Batched policy iteration should match policy iteration on each MDP"""
+
+    gamma = 0.97
+    P, r = random_mdps(25)
+    pi_batch, V_batch, converged = policy_improvement_batch(P, r, gamma)
+
+    assert converged.all()
+    for n in range(P.shape[0]):
+        pi_opt, V_opt = policy_improvement_infinite(P[n], r[n], gamma)
+        assert np.allclose(V_batch[n], V_opt, atol=1e-4)
+        assert np.allclose(V_batch[n], evaluate_pi_infinite(pi_batch[n], P[n], r[n], gamma), atol=1e-4)
+
+def test_modified_policy_iteration():
+    """Modified policy iteration and warm-started policy iteration should find the optimal values"""
+
+    gamma = 0.97
+    P, r = random_mdps(10)
+    for n in range(P.shape[0]):
+        pi_opt, V_opt = policy_improvement_infinite(P[n], r[n], gamma)
+        pi_mpi, V_mpi = policy_improvement_infinite(P[n], r[n], gamma, tolerance=1e-10, eval_sweeps=5)
+        assert np.allclose(V_mpi, V_opt, atol=1e-6)
+        pi_warm, V_warm = policy_improvement_infinite(P[n], r[n], gamma, pi0=pi_opt)
+        assert np.array_equal(pi_warm, pi_opt) and np.allclose(V_warm, V_opt)
+        pi_mpi, V_mpi = policy_improvement_infinite(P[n], r[n], gamma, eval_sweeps=1, V0=V_opt)
+        assert np.allclose(V_mpi, V_opt)
+
+def test_reproducible_initial_policies():
+    """Default and seeded initial policies should give identical results across runs"""
+
+    gamma = 0.97
+    P, r = random_mdps(5)
+    for n in range(P.shape[0]):
+        pi_a, V_a = policy_improvement_infinite(P[n], r[n], gamma)
+        pi_b, V_b = policy_improvement_infinite(P[n], r[n], gamma)
+        assert np.array_equal(pi_a, pi_b) and np.array_equal(V_a, V_b)
+        pi_a, V_a = policy_improvement_infinite(P[n], r[n], gamma, rng=np.random.default_rng([1, n]))
+        pi_b, V_b = policy_improvement_infinite(P[n], r[n], gamma, rng=np.random.default_rng([1, n]))
+        assert np.array_equal(pi_a, pi_b) and np.array_equal(V_a, V_b)
+    pi_a, V_a, _ = policy_improvement_batch(P, r, gamma, rng=np.random.default_rng(1))
+    pi_b, V_b, _ = policy_improvement_batch(P, r, gamma, rng=np.random.default_rng(1))
+    assert np.array_equal(pi_a, pi_b) and np.array_equal(V_a, V_b)
+
+if __name__ == "__main__":
+    test_evaluate_pi_direct()
+    test_evaluate_pi_stack()
+    test_bellman_kernel()
+    test_policy_evaluation_context()
+    test_policy_improvement_batch()
+    test_modified_policy_iteration()
+    test_reproducible_initial_policies()
+    print("🎉 All tests passed! Policy evaluation functions are working correctly.")
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Test script for post_treatment_risk.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from post_treatment_risk import new_risk, post_treatment_risk
+
+def test_post_treatment_risk():
+    """Array post-treatment risks should match the per-event scalar calculation"""
+
+    rng = np.random.default_rng(0)
+    sbpreduc = rng.uniform(0, 40, size=(4, 3))
+    pretrtrisk = rng.uniform(0, 0.3, size=(4, 3, 2))
+    riskslope = rng.uniform(0.3, 0.7, size=2)  # relative risks of a 20 mm Hg reduction
+    slopes = pd.DataFrame([np.concatenate(([60], riskslope))]).iloc[0, 1:3]  # labelled like a row of the risk slope table
+
+    risk = post_treatment_risk(sbpreduc[..., None], riskslope, pretrtrisk)
+    assert risk.shape == pretrtrisk.shape
+    for e in range(2):
+        assert np.array_equal(risk[..., e], post_treatment_risk(sbpreduc, slopes, pretrtrisk[..., e], e))
+        for i, j in np.ndindex(sbpreduc.shape):
+            assert risk[i, j, e] == new_risk(sbpreduc[i, j], slopes, pretrtrisk[i, j, e], e)
+
+    # No reduction, no change in risk; larger reductions, lower risks
+    assert np.array_equal(post_treatment_risk(0, riskslope, pretrtrisk), pretrtrisk)
+    assert np.all(post_treatment_risk(20, riskslope, pretrtrisk) <= pretrtrisk)
+
+if __name__ == "__main__":
+    test_post_treatment_risk()
+    print("🎉 All tests passed! Post-treatment risks are working correctly.")
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Test script for risk_based_policy_infinite.py using randomly generated patients
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from risk_based_policy_infinite import risk_policy_infinite, risk_policy_batch
+from test_aha_2017_guideline_infinite import random_patients
+
+def test_risk_policy_batch():
+    """The batched risk-based policies should reproduce the per-patient titration for every threshold"""
+
+    pretrtrisk, pretrtsbp, pretrtdbp, riskslope = random_patients(200, seed=1)
+    thresholds = np.arange(0.05, 0.2001, 0.005)
+    for numtrt in (5, 1):
+        policies = risk_policy_batch(pretrtrisk, pretrtsbp, pretrtdbp, thresholds, 0.025, 120, 55, riskslope, numtrt)
+        assert policies.shape == (len(thresholds),) + pretrtsbp.shape
+        for t in (0, 10, len(thresholds)-1):
+            assert np.array_equal(policies[t], risk_policy_batch(pretrtrisk, pretrtsbp, pretrtdbp, thresholds[t], 0.025,
+                                                                 120, 55, riskslope, numtrt))
+            for n in range(pretrtrisk.shape[0]):
+                expected = risk_policy_infinite(pretrtrisk[n], pretrtsbp[n], pretrtdbp[n], thresholds[t], 0.025, 120, 55,
+                                                pd.DataFrame(riskslope[n].reshape(1, 2)), numtrt)
+                assert np.array_equal(policies[t, n], expected)
+
+if __name__ == "__main__":
+    test_risk_policy_batch()
+    print("🎉 All tests passed! Risk-based policies are working correctly.")
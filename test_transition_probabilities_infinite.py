@@ -22,7 +22,11 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import numpy as np
 import pandas as pd
-from transition_probabilities_infinite import TP_infinite
+from transition_probabilities_infinite import TP_infinite, TP_infinite_batch, CompactTransitions
+from post_treatment_risk import new_risk
+from sbp_reductions_drugtype import sbp_reductions
+from dbp_reductions_drugtype import dbp_reductions
+from drug_combinations import drug_combinations
 
 def test_transition_probabilities():
     """Test the TP_infinite function with actual patient data (patient 0)"""
@@ -66,8 +70,8 @@ def test_transition_probabilities():
     print()
     
     print("Actual Risk Slopes (from risk data):")
-    print(f"  - CHD risk slope: {riskslope.iloc[0]:.2f}")
-    print(f"  - Stroke risk slope: {riskslope.iloc[1]:.2f}")
+    print(f"  - CHD risk slope: {riskslope[0]:.2f}")
+    print(f"  - Stroke risk slope: {riskslope[1]:.2f}")
     print()
     
     print("Actual Pre-treatment Blood Pressure:")
@@ -288,6 +292,144 @@ def test_with_real_data():
         traceback.print_exc()
         return False
 
+# Reference copy of the per-patient loop that TP_infinite replaced (with the feasibility repair applied to
+# every state, as in TP_infinite_batch)
+def tp_infinite_loop(periodrisk, chddeath, strokedeath, alldeath, riskslope, pretrtsbp, pretrtdbp, sbpmin, dbpmin,
+                     sbpmax, dbpmax, alldrugs):
+    numhealth, events = periodrisk.shape
+    numtrt = len(alldrugs)
+    feasible = np.empty((numhealth, numtrt)); feasible[:] = np.nan
+    risk = np.empty((numhealth, events, numtrt)); risk[:] = np.nan
+    ptrans = np.zeros((numhealth, numhealth, numtrt))
+    sbpreduc = np.empty((numhealth, numtrt))
+    dbpreduc = np.empty((numhealth, numtrt))
+
+    for j in range(numtrt):  # each treatment
+        for h in range(numhealth):  # each health state
+            if j == 0:  # the do nothing treatment
+                sbpreduc[h, j] = 0; dbpreduc[h, j] = 0
+                feasible[h, j] = 0 if pretrtsbp[h] > sbpmax or pretrtdbp[h] > dbpmax else 1
+            else:  # prescribe >0 drugs
+                sbpreduc[h, j] = sbp_reductions(j, pretrtsbp[h], alldrugs)
+                dbpreduc[h, j] = dbp_reductions(j, pretrtdbp[h], alldrugs)
+                newsbp = pretrtsbp[h] - sbpreduc[h, j]
+                newdbp = pretrtdbp[h] - dbpreduc[h, j]
+                if (newsbp < sbpmin or pretrtsbp[h] < 0) or (newdbp < dbpmin or dbpreduc[h, j] < 0):
+                    feasible[h, j] = 0
+                else:
+                    feasible[h, j] = 1
+
+            for k in range(events):  # each event type
+                risk[h, k, j] = new_risk(sbpreduc[h, j], riskslope, periodrisk[h, k], k)
+
+            if h in (6, 7, 8, 9):  # Dead
+                ptrans[h, 9, j] = 1
+            else:
+                alternate = {3: 3, 4: 1, 1: 1, 5: 2, 2: 2}.get(h, 0)
+                while True:  # compute transition probabilities
+                    ptrans[h, 8, j] = min(1, strokedeath * risk[h, 1, j])
+                    cumulprob = ptrans[h, 8, j]
+                    ptrans[h, 7, j] = min(1, chddeath * risk[h, 0, j])
+                    if cumulprob + ptrans[h, 7, j] >= 1:
+                        ptrans[h, 7, j] = 1 - cumulprob
+                        break
+                    cumulprob += ptrans[h, 7, j]
+                    ptrans[h, 6, j] = min(1, alldeath)
+                    if cumulprob + ptrans[h, 6, j] >= 1:
+                        ptrans[h, 6, j] = 1 - cumulprob
+                        break
+                    cumulprob += ptrans[h, 6, j]
+                    ptrans[h, 5, j] = min(1, (1 - strokedeath) * risk[h, 1, j])
+                    if cumulprob + ptrans[h, 5, j] >= 1:
+                        ptrans[h, 5, j] = 1 - cumulprob
+                        break
+                    cumulprob += ptrans[h, 5, j]
+                    ptrans[h, 4, j] = min(1, (1 - chddeath) * risk[h, 0, j])
+                    if cumulprob + ptrans[h, 4, j] >= 1:
+                        ptrans[h, 4, j] = 1 - cumulprob
+                        break
+                    cumulprob += ptrans[h, 4, j]
+                    ptrans[h, alternate, j] = 1 - cumulprob
+                    break
+
+    # Making sure that no treatment is feasible if nothing else is
+    for h in range(numhealth):
+        if feasible[h, :].max() == 0:
+            feasible[h, 0] = 1
+
+    return ptrans, feasible
+
+def test_transition_probabilities_batch():
+    """Test that TP_infinite_batch (and TP_infinite) match the reference per-patient loop"""
+
+    print("\n" + "=" * 60)
+    print("TESTING BATCHED TRANSITION PROBABILITIES")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    numhealth, events = 10, 2
+    for N, alldrugs in ((50, ["NT", "ACE", "ARB", "BB", "CCB", "TH"]), (8, drug_combinations())):
+        # Random patients (including risks high enough to exhaust the probability mass)
+        periodrisk = rng.random((N, numhealth, events))*rng.choice([0.05, 0.5, 2], (N, 1, 1)); periodrisk[:, 6:, :] = 0
+        chddeath, strokedeath = rng.random(N), rng.random(N)
+        alldeath = rng.random(N)*0.05
+        riskslope = rng.uniform(0.3, 0.8, (N, events))
+        pretrtsbp = np.repeat(rng.uniform(100, 200, (N, 1)), numhealth, axis=1)
+        pretrtdbp = np.repeat(rng.uniform(50, 110, (N, 1)), numhealth, axis=1)
+
+        ptrans, feasible = TP_infinite_batch(periodrisk, chddeath, strokedeath, alldeath, riskslope, pretrtsbp,
+                                             pretrtdbp, 120, 55, 150, 90, alldrugs)
+        print(f"   - Batched transition tensor shape: {ptrans.shape}")
+
+        assert ptrans.shape == (N, numhealth, numhealth, len(alldrugs))
+        assert np.allclose(ptrans.sum(axis=2), 1)
+        assert (feasible.max(axis=2) == 1).all()  # every state has a feasible treatment
+        for n in range(N):
+            ptrans_ref, feasible_ref = tp_infinite_loop(periodrisk[n], chddeath[n], strokedeath[n], alldeath[n],
+                                                        riskslope[n], pretrtsbp[n], pretrtdbp[n], 120, 55, 150, 90,
+                                                        alldrugs)
+            assert np.allclose(ptrans[n], ptrans_ref, rtol=0, atol=1e-15)
+            assert np.array_equal(feasible[n], feasible_ref)
+            ptrans_n, feasible_n = TP_infinite(periodrisk[n], chddeath[n], strokedeath[n], alldeath[n], riskslope[n],
+                                               pretrtsbp[n], pretrtdbp[n], 120, 55, 150, 90, alldrugs)
+            assert np.array_equal(ptrans_n, ptrans[n]) and np.array_equal(feasible_n, feasible[n])
+
+    print("✅ Batched transition probabilities match the per-patient loop!")
+
+def test_compact_transitions():
+    """Test that compact transition probabilities match the dense tensor in the policy routines"""
+
+    from policy_evaluation_infinite import bellman_q, policy_transitions, policy_improvement_batch
+
+    rng = np.random.default_rng(1)
+    N, numhealth, events = 20, 10, 2
+    alldrugs = ["NT", "ACE", "ARB", "BB", "CCB", "TH"]
+    periodrisk = rng.random((N, numhealth, events))*rng.choice([0.05, 0.5, 2], (N, 1, 1)); periodrisk[:, 6:, :] = 0
+    args = (periodrisk, rng.random(N), rng.random(N), rng.random(N)*0.05, rng.uniform(0.3, 0.8, (N, events)),
+            np.repeat(rng.uniform(100, 200, (N, 1)), numhealth, axis=1),
+            np.repeat(rng.uniform(50, 110, (N, 1)), numhealth, axis=1), 120, 55, 150, 90, alldrugs)
+
+    ptrans, _ = TP_infinite_batch(*args)
+    compact, _ = TP_infinite_batch(*args, compact=True)
+    compact32, _ = TP_infinite_batch(*args, compact=True, dtype=np.float32)
+    assert isinstance(compact, CompactTransitions) and compact.shape == ptrans.shape
+    assert np.array_equal(compact.toarray(), ptrans)
+    assert ptrans.nbytes > 5*compact32.nbytes
+
+    r = rng.random((N, numhealth, len(alldrugs)))
+    V = rng.random((N, numhealth))
+    pi = rng.integers(0, len(alldrugs), (N, numhealth))
+    assert np.allclose(bellman_q(compact, r, V, 0.97), bellman_q(ptrans, r, V, 0.97))
+    assert np.array_equal(policy_transitions(compact, pi), policy_transitions(ptrans, pi))
+    assert np.allclose(bellman_q(compact[0], r[0], V[:3], 0.97), bellman_q(ptrans[0], r[0], V[:3], 0.97))
+    assert np.array_equal(policy_transitions(compact[0], pi[:3]), policy_transitions(ptrans[0], pi[:3]))
+
+    pi_dense, V_dense, _ = policy_improvement_batch(ptrans, r, 0.97)
+    pi_compact, V_compact, _ = policy_improvement_batch(compact32, r, 0.97)
+    assert np.array_equal(pi_dense, pi_compact) and np.allclose(V_dense, V_compact, atol=1e-4)
+
+    print("✅ Compact transition probabilities match the dense tensor!")
+
 if __name__ == "__main__":
     print("🧪 Testing Transition Probabilities for Infinite Horizon MDP")
     print("=" * 60)
@@ -297,6 +439,10 @@ if __name__ == "__main__":
     
     # Test with real data
     success2 = test_with_real_data()
+
+    # Test batched calculations
+    test_transition_probabilities_batch()
+    test_compact_transitions()
     
     if success1 and success2:
         print("\n🎉 All tests passed! Transition probabilities are working correctly.")
@@ -4,13 +4,12 @@
 
 # Loading modules
 import numpy as np
-from post_treatment_risk import new_risk
-from sbp_reductions_drugtype import sbp_reductions
-from dbp_reductions_drugtype import dbp_reductions
+from drug_combinations import bp_reductions
+from post_treatment_risk import post_treatment_risk
 
 # Transition probabilities' calculation for infinite horizon MDP
 def TP_infinite(periodrisk, chddeath, strokedeath, alldeath, riskslope, pretrtsbp, pretrtdbp, sbpmin, dbpmin,
-                sbpmax, dbpmax, alldrugs, age_index=0):
+                sbpmax, dbpmax, alldrugs, age_index=0, compact=False, dtype=np.float64):
     """
     Calculating probability of health states transitions for infinite horizon MDP
     Uses time-independent parameters based on a reference age/time point
@@ -27,94 +26,192 @@ def TP_infinite(periodrisk, chddeath, strokedeath, alldeath, riskslope, pretrtsb
     dbpmin: minimum DBP allowed (clinical constraint)
     alldrugs: treatment options being considered
     age_index: index for reference age (default 0 for first age/time point)
+    compact: whether to return CompactTransitions instead of the dense tensor
+    dtype: floating point type of the stored probabilities (e.g., np.float32 to save memory)
+    
+    Outputs:
+    ptrans: state transition probabilities (S x S x A), or CompactTransitions if compact
+    feasible: feasibility indicators (S x A)
+    """
+
+    ptrans, feasible = TP_infinite_batch(periodrisk[None], np.array([chddeath]), np.array([strokedeath]),
+                                         np.array([alldeath]), np.asarray(riskslope, dtype=float)[None],
+                                         np.asarray(pretrtsbp, dtype=float)[None], np.asarray(pretrtdbp, dtype=float)[None],
+                                         sbpmin, dbpmin, sbpmax, dbpmax, alldrugs, compact, dtype)
+
+    return ptrans[0], feasible[0]
+
+# Default state for each alive health state if neither a CHD event, a stroke, nor death occurs
+ALTERNATE_STATE = np.array([0, 1, 2, 3, 1, 2])  # healthy, history of CHD (or CHD event), history of stroke (or stroke), history of both
+ALIVE_STATES = np.arange(6)  # states 0-5 (states 6-9 are dead)
+DEAD_STATES = np.arange(6, 10)  # every dead state moves to state 9
+ABSORBING_STATE = 9
+
+# Only reachable states from each alive state: the alternate state, CHD and stroke events (4, 5), and deaths (6-8)
+OUTCOME_STATES = np.column_stack((ALTERNATE_STATE, np.broadcast_to([4, 5, 6, 7, 8], (len(ALIVE_STATES), 5))))
+
+class CompactTransitions:
+    """
+    Structured-sparse transition probabilities exploiting the fixed state graph of the case study
+
+    Only the probabilities of moving from each alive state to its reachable states (OUTCOME_STATES) are stored,
+    in an array of shape (alive states x outcomes x A), or (N x alive states x outcomes x A) for a batch of MDPs,
+    optionally as float32; dead states move to ABSORBING_STATE with probability 1. With float32 probabilities,
+    this is about 5.5 times smaller than the dense (S x S x A) float64 tensor.
+
+    Objects behave as the dense tensor of shape (S x S x A) or (N x S x S x A) in the policy evaluation and
+    improvement routines (through bellman_q and policy_transitions); only the batch axis can be indexed.
+    """
+
+    def __init__(self, probs):
+        self.probs = probs
+
+    @property
+    def ndim(self):
+        return self.probs.ndim
+
+    @property
+    def shape(self):
+        S = len(ALIVE_STATES) + len(DEAD_STATES)
+        return self.probs.shape[:-3] + (S, S, self.probs.shape[-1])
+
+    @property
+    def nbytes(self):
+        return self.probs.nbytes
+
+    def __getitem__(self, key):
+        if self.probs.ndim == 3 and key is not None:
+            raise IndexError("Only the batch axis of compact transition probabilities can be indexed")
+
+        return CompactTransitions(self.probs[key])
+
+    def take_actions(self, actions):
+        """Transition probabilities of a subset (or reordering) of the actions"""
+
+        return CompactTransitions(self.probs[..., actions])
+
+    def toarray(self):
+        """Dense transition probabilities (S x S x A) or (N x S x S x A)"""
+
+        ptrans = np.zeros(self.shape, dtype=self.probs.dtype)
+        ptrans[..., DEAD_STATES, ABSORBING_STATE, :] = 1
+        ptrans[..., ALIVE_STATES[:, None], OUTCOME_STATES, :] = self.probs
+
+        return ptrans
+
+    def expectation(self, V):
+        """
+        Expected next value sum_t P(t|s,a)V(t) of every state-action pair
+
+        Inputs:
+        V: value functions (S,) or (K x S) for one MDP, or (N x S) for a batch of MDPs
+
+        Outputs:
+        PV: expected next values (S x A), (K x S x A), or (N x S x A)
+        """
+
+        V = np.asarray(V, dtype=float)
+        if self.probs.ndim == 3:
+            alive = np.einsum('...so,soa->...sa', V[..., OUTCOME_STATES], self.probs)
+        else:
+            alive = np.einsum('nso,nsoa->nsa', V[..., OUTCOME_STATES], self.probs)
+        dead = np.broadcast_to(V[..., ABSORBING_STATE, None, None], alive.shape[:-2] + (len(DEAD_STATES), alive.shape[-1]))
+
+        return np.concatenate((alive, dead), axis=-2)
+
+    def policy_transitions(self, pi):
+        """
+        Dense transition probabilities under deterministic policies
+
+        Inputs:
+        pi: policies (S,) or (K x S) for one MDP, or (N x S) for a batch of MDPs
+
+        Outputs:
+        P_pi: transition probabilities under the policies (S x S), (K x S x S), or (N x S x S)
+        """
+
+        pi = np.asarray(pi).astype(int)
+        states = np.arange(len(ALIVE_STATES))[:, None]; outcomes = np.arange(OUTCOME_STATES.shape[1])[None, :]
+        if self.probs.ndim == 3:
+            probs = self.probs[states, outcomes, pi[..., ALIVE_STATES, None]]
+        else:
+            probs = self.probs[np.arange(pi.shape[0])[:, None, None], states, outcomes, pi[..., ALIVE_STATES, None]]
+
+        P_pi = np.zeros(pi.shape + (pi.shape[-1],))
+        P_pi[..., DEAD_STATES, ABSORBING_STATE] = 1
+        P_pi[..., ALIVE_STATES[:, None], OUTCOME_STATES] = probs
+
+        return P_pi
+
+# Transition probabilities' calculation for a batch of infinite horizon MDPs
+def TP_infinite_batch(periodrisk, chddeath, strokedeath, alldeath, riskslope, pretrtsbp, pretrtdbp, sbpmin, dbpmin,
+                      sbpmax, dbpmax, alldrugs, compact=False, dtype=np.float64):
+    """
+    Calculating probability of health states transitions for a batch of patients (infinite horizon MDP)
+    Same calculations as TP_infinite, computed for every patient, state and treatment at once
+    
+    Inputs:
+    periodrisk: 1-year risk of CHD and stroke (N x S x E)
+    chddeath, strokedeath, alldeath: likelihood of death given a CHD event, a stroke, or due to non-ASCVD events (N,)
+    riskslope: relative risk estimates of CHD and stroke events (N x E)
+    pretrtsbp, pretrtdbp: pre-treatment SBP and DBP (N x S)
+    sbpmin (sbpmax): Minimum (maximum) SBP allowed (clinical constraint)
+    dbpmin (dbpmax): minimum (maximum) DBP allowed (clinical constraint)
+    alldrugs: treatment options being considered
+    compact: whether to return CompactTransitions instead of the dense tensor
+    dtype: floating point type of the stored probabilities (e.g., np.float32 to save memory)
+    
+    Outputs:
+    ptrans: state transition probabilities (N x S x S x A), or CompactTransitions if compact
+    feasible: feasibility indicators (N x S x A)
     """
 
     # Extracting parameters
-    numhealth = periodrisk.shape[0]  # number of states
-    events = periodrisk.shape[1]  # number of events (time dimension removed)
+    N, numhealth = periodrisk.shape[0], periodrisk.shape[1]  # number of patients and states
     numtrt = len(alldrugs)  # number of treatment choices
 
-    # Storing feasibility indicators (time-independent)
-    feasible = np.empty((numhealth, numtrt)); feasible[:] = np.nan
-
-    # Storing risk and TP calculations (time-independent)
-    risk = np.empty((numhealth, events, numtrt)); risk[:] = np.nan
-    ptrans = np.zeros((numhealth, numhealth, numtrt))  # state transition probabilities
-
-    # Storing BP reductions (time-independent)
-    sbpreduc = np.empty((numhealth, numtrt))
-    dbpreduc = np.empty((numhealth, numtrt))
-
-    for j in range(numtrt):  # each treatment
-        for h in range(numhealth):  # each health state
-            if j == 0:  # the do nothing treatment
-                sbpreduc[h, j] = 0; dbpreduc[h, j] = 0  # no reduction when taking 0 drugs
-                if pretrtsbp[h] > sbpmax or pretrtdbp[h] > dbpmax:
-                    feasible[h, j] = 0  # must give treatment
-                else:
-                    feasible[h, j] = 1  # do nothing is always feasible
-            else: # prescribe >0 drugs
-                sbpreduc[h, j] = sbp_reductions(j, pretrtsbp[h], alldrugs)
-                dbpreduc[h, j] = dbp_reductions(j, pretrtdbp[h], alldrugs)
-                newsbp = pretrtsbp[h] - sbpreduc[h, j]
-                newdbp = pretrtdbp[h] - dbpreduc[h, j]
-                if (newsbp < sbpmin or pretrtsbp[h] < 0) or (newdbp < dbpmin or dbpreduc[h, j] < 0):
-                    feasible[h, j] = 0
-                else:
-                    feasible[h, j] = 1
-
-            for k in range(events):  # each event type
-                # Calculating post-treatment risks (time-independent)
-                risk[h, k, j] = new_risk(sbpreduc[h, j], riskslope, periodrisk[h, k], k)
-
-            # Health state transition probabilities: allows for both CHD and stroke in same period
-            # Let Dead state dominate the transition to all others
-            if h == 6 or h == 7 or h == 8 or h == 9:  # Dead
-                ptrans[h, 9, j] = 1  # must stay dead
-            else:  # alternate denotes the state that is default state if neither a CHD event stroke, nor death occurs
-                if h == 3:  # History of CHD and Stroke
-                    alternate = 3
-                elif h == 4 or h == 1:  # CHD Event or History of CHD
-                    alternate = 1
-                elif h == 5 or h == 2:  # Stroke or History of Stroke
-                    alternate = 2
-                else:  # Healthy
-                    alternate = 0
-
-                quits = 0
-                while quits == 0:  # compute transition probabilities
-                    ptrans[h, 8, j] = min(1, strokedeath * risk[h, 1, j])  # likelihood of death from stroke
-                    cumulprob = ptrans[h, 8, j]
-
-                    ptrans[h, 7, j] = min(1, chddeath * risk[h, 0, j])  # likelihood of death from CHD event
-                    if cumulprob + ptrans[h, 7, j] >= 1:
-                        ptrans[h, 7, j] = 1 - cumulprob
-                        break
-                    cumulprob += ptrans[h, 7, j]
-
-                    ptrans[h, 6, j] = min(1, alldeath)  # likelihood of death from non CVD cause
-                    if cumulprob + ptrans[h, 6, j] >= 1:
-                        ptrans[h, 6, j] = 1 - cumulprob
-                        break
-                    cumulprob += ptrans[h, 6, j]
-
-                    ptrans[h, 5, j] = min(1, (1 - strokedeath) * risk[h, 1, j])  # likelihood of having stroke and surviving
-                    if cumulprob + ptrans[h, 5, j] >= 1:
-                        ptrans[h, 5, j] = 1 - cumulprob
-                        break
-                    cumulprob += ptrans[h, 5, j]
-
-                    ptrans[h, 4, j] = min(1, (1 - chddeath) * risk[h, 0, j])  # likelihood of having CHD and surviving
-                    if cumulprob + ptrans[h, 4, j] >= 1:
-                        ptrans[h, 4, j] = 1 - cumulprob
-                        break
-                    cumulprob += ptrans[h, 4, j]
-
-                    ptrans[h, alternate, j] = 1 - cumulprob  # otherwise, you go to the alternate state
-                    break
-
-        # Making sure that no treatment is feasible if nothing else is
-        if feasible[h, :].max() == 0:
-            feasible[h, 0] = 1
+    # BP reductions (no reduction when taking 0 drugs)
+    sbpreduc, dbpreduc = bp_reductions(alldrugs, pretrtsbp, pretrtdbp)
+
+    # Feasibility indicators
+    feasible = np.empty((N, numhealth, numtrt))
+    feasible[:, :, 0] = ~((pretrtsbp > sbpmax) | (pretrtdbp > dbpmax))  # must give treatment if BP is too high
+    newsbp = pretrtsbp[:, :, None] - sbpreduc[:, :, 1:]
+    newdbp = pretrtdbp[:, :, None] - dbpreduc[:, :, 1:]
+    feasible[:, :, 1:] = ~((newsbp < sbpmin) | (pretrtsbp[:, :, None] < 0) | (newdbp < dbpmin) | (dbpreduc[:, :, 1:] < 0))
+
+    # Making sure that no treatment is feasible if nothing else is
+    feasible[:, :, 0] = np.where(feasible.max(axis=2) == 0, 1, feasible[:, :, 0])
+
+    # Calculating post-treatment risks (N x S x E x A)
+    risk = post_treatment_risk(sbpreduc[:, :, None, :], riskslope[:, None, :, None], periodrisk[:, :, :, None])
+
+    # Health state transition probabilities: allows for both CHD and stroke in same period
+    # Let Dead state dominate the transition to all others
+    alive_risk = risk[:, ALIVE_STATES]  # (N x alive states x E x A)
+    chd = chddeath[:, None, None]; stroke = strokedeath[:, None, None]
+    outcomes = [(8, stroke*alive_risk[:, :, 1]),  # likelihood of death from stroke
+                (7, chd*alive_risk[:, :, 0]),  # likelihood of death from CHD event
+                (6, np.broadcast_to(alldeath[:, None, None], alive_risk[:, :, 0].shape)),  # likelihood of death from non CVD cause
+                (5, (1 - stroke)*alive_risk[:, :, 1]),  # likelihood of having stroke and surviving
+                (4, (1 - chd)*alive_risk[:, :, 0])]  # likelihood of having CHD and surviving
+
+    probs = np.empty((N,) + OUTCOME_STATES.shape + (numtrt,))  # probabilities of reachable states (N x alive states x outcomes x A)
+    cumulprob = np.zeros(alive_risk[:, :, 0].shape)
+    capped = np.zeros(cumulprob.shape, dtype=bool)  # probability mass already exhausted
+    for state, prob in outcomes:
+        prob = np.minimum(1, prob)
+        reached = ~capped & (cumulprob + prob >= 1)
+        prob = np.where(capped, 0, np.where(reached, 1 - cumulprob, prob))
+        probs[:, :, list(OUTCOME_STATES[0]).index(state), :] = prob
+        cumulprob = cumulprob + prob
+        capped |= reached
+
+    # otherwise, you go to the alternate state
+    probs[:, :, 0, :] = np.where(capped, 0, 1 - cumulprob)
+
+    ptrans = CompactTransitions(probs.astype(dtype, copy=False))
+    if not compact:
+        ptrans = ptrans.toarray()  # must stay dead in states 6-9
 
     return ptrans, feasible
@@ -28,47 +28,37 @@ import numpy as np
 import pandas as pd
 from transition_probabilities_infinite import TP_infinite
 from ascvd_risk import arisk
+from life_tables import LifeTables
+from nhanes_cache import load_nhanes_cache
+from cohort_runner_infinite import load_lookup_tables
 
-def load_patient_data():
-    """Load actual patient data for patient_id = 0"""
+def load_patient_data(pt_id=0):
+    """Load actual patient data for a specific patient (patient_id = 0 by default)"""
     
     print("Loading actual patient data...")
     
-    # Load data from Data folder
-    os.chdir('Data')
+    # Load life expectancy, death likelihood, and risk slope data (as age-indexed lookup arrays)
+    tables = load_lookup_tables()
+    lifetables = LifeTables(**tables)
     
-    # Load life expectancy and death likelihood data
-    lifedata = pd.read_csv('lifedata.csv', header=None)
-    strokedeathdata = pd.read_csv('strokedeathdata.csv', header=None)
-    chddeathdata = pd.read_csv('chddeathdata.csv', header=None)
-    alldeathdata = pd.read_csv('alldeathdata.csv', header=None)
-    riskslopedata = pd.read_csv('riskslopes.csv', header=None)
-    
-    # Load patient data
-    os.chdir('Continuous NHANES')
-    ptdata = pd.read_csv('Continuous NHANES Forecasted Dataset.csv')
-    
-    # Go back to main directory
-    os.chdir('..')
-    os.chdir('..')
+    # Load patient data (memory-mapped cache of the NHANES forecasted dataset)
+    try:
+        patient_data = load_nhanes_cache().patient(pt_id)
+    except KeyError:
+        raise ValueError(f"No patient data found for patient ID {pt_id}")
     
     print(f"✅ Data loaded successfully!")
-    print(f"   - Patient data: {len(ptdata)} records")
-    print(f"   - Life data: {len(lifedata)} records")
-    print(f"   - Risk slope data: {len(riskslopedata)} records")
+    print(f"   - Patient data: {len(patient_data)} records")
+    print(f"   - Life data: {len(tables['lifedata'])} records")
+    print(f"   - Risk slope data: {len(tables['riskslopedata'])} records")
     
-    return ptdata, lifedata, strokedeathdata, chddeathdata, alldeathdata, riskslopedata
+    return patient_data, lifetables
 
 def calculate_patient_periodrisk(pt_id=0, reference_age_index=0):
     """Calculate periodrisk for a specific patient using the same logic as patient_simulation_infinite_no_gurobi"""
     
     # Load data
-    ptdata, lifedata, strokedeathdata, chddeathdata, alldeathdata, riskslopedata = load_patient_data()
-    
-    # Get patient data
-    patient_data = ptdata[ptdata.id == pt_id]
-    if len(patient_data) == 0:
-        raise ValueError(f"No patient data found for patient ID {pt_id}")
+    patient_data, lifetables = load_patient_data(pt_id)
     
     print(f"Patient {pt_id} data: {len(patient_data)} records")
     print(f"Patient age: {patient_data.age.iloc[reference_age_index]}")
@@ -125,18 +115,14 @@ def calculate_patient_periodrisk(pt_id=0, reference_age_index=0):
                 periodrisk[h, k] = ascvdrisk
     
     # Death rates
-    if patient_data.sex.iloc[reference_age_index] == 1:  # male
-        sexcol = 1
-    else:
-        sexcol = 2
-    
+    sex = patient_data.sex.iloc[reference_age_index]
     age = patient_data.age.iloc[reference_age_index]
-    chddeath = chddeathdata.iloc[np.where(chddeathdata.iloc[:, 0] == age)[0][0], sexcol]
-    strokedeath = strokedeathdata.iloc[np.where(strokedeathdata.iloc[:, 0] == age)[0][0], sexcol]
-    alldeath = alldeathdata.iloc[np.where(alldeathdata.iloc[:, 0] == age)[0][0], sexcol]
+    chddeath = lifetables.chddeath(age, sex)
+    strokedeath = lifetables.strokedeath(age, sex)
+    alldeath = lifetables.alldeath(age, sex)
     
     # Risk slopes
-    riskslope = riskslopedata.iloc[np.where(riskslopedata.iloc[:, 0] == age)[0][0], 1:3]
+    riskslope = lifetables.riskslopes(age)
     
     # Clinical constraints
     sbpmin, dbpmin, sbpmax, dbpmax = 120, 55, 150, 90
@@ -158,8 +144,8 @@ def calculate_patient_periodrisk(pt_id=0, reference_age_index=0):
     print(f"  All-cause death: {alldeath:.4f}")
     
     print(f"\nRisk slopes:")
-    print(f"  CHD: {riskslope.iloc[0]:.4f}")
-    print(f"  Stroke: {riskslope.iloc[1]:.4f}")
+    print(f"  CHD: {riskslope[0]:.4f}")
+    print(f"  Stroke: {riskslope[1]:.4f}")
     
     return periodrisk, chddeath, strokedeath, alldeath, riskslope, pretrtsbp, pretrtdbp, sbpmin, dbpmin, sbpmax, dbpmax, alldrugs
 